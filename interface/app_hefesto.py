@@ -1,15 +1,24 @@
 # app_hefesto.py (versão revisada — Aprovar usa emergencyAuthorize direto)
 import streamlit as st
 from web3 import Web3
-import hashlib
 import json
 import os
+import sys
 from datetime import datetime
 
+# módulos compartilhados com o cliente CLI (python/)
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "python"))
+from signers import build_signer_pool
+from hash_cache import HashCache
+from providers import ProviderPool, rpc_urls
+from outbox import Outbox, CONFIRMADO, REVERTIDO, FALHOU
+from ops_table import OperationsTable
+
 # ---------------------------
 # CONFIGURAÇÕES
 # ---------------------------
 
+# Nó padrão; vários nós via HEFESTO_RPC_URLS (ver python/providers.py)
 GANACHE_URL = "http://127.0.0.1:7545"
 
 # Contrato Inventário (já existente)
@@ -20,10 +29,16 @@ ABI_INVENTARIO_PATH = "../python/abis/HefestoInventario.json"
 CONTRACT_LOGISTICA_ADDRESS = "0x0aB8478A571D6a81B4f5295EFa196Ac16b05541a"
 ABI_LOGISTICA_PATH = "../python/abis/HefestoLogistica.json"
 
-# Conta usada para assinar transações (ganache account) - para PoC local
+# Conta padrão para assinar transações (ganache account) - para PoC local.
+# As demais contas (uma por quartel) vêm do keystore local — ver python/signers.py
 PRIVATE_KEY = "0x847f133ca3db2c19254b4f9f244d7415fd30a1952f4cb4bd0b4bcefdfc16cdc2"
 ACCOUNT_ADDRESS = "0x6Abc0B7A1360b6A4fC6c87D0e3a45F4DD9c6E17f"
 
+# Fila local de escritas (SQLite) — ações não se perdem com o nó fora do ar
+OUTBOX_PATH = os.environ.get("HEFESTO_OUTBOX", "../hefesto_outbox.db")
+OUTBOX_WAIT = 30  # segundos que a interface aguarda a confirmação antes de deixar na fila
+QUEUED_MSG = "📥 Nó indisponível — ação gravada na fila local e será enviada automaticamente quando a rede voltar."
+
 # Senha simples para área de aprovação (PoC)
 APPROVAL_PASSWORD = "1234"
 
@@ -41,10 +56,14 @@ def load_css(filename: str = "military_theme.css"):
     except Exception as e:
         st.warning(f"Erro ao carregar CSS: {e}")
 
-def calc_hash(file_bytes: bytes) -> str:
-    """Retorna hash SHA-256 em formato 0x... (64 hex)."""
-    h = hashlib.sha256(file_bytes).hexdigest()
-    return "0x" + h
+@st.cache_resource
+def get_hash_cache():
+    """Cache LRU de hashes compartilhado entre reruns e sessões."""
+    return HashCache()
+
+def calc_upload_hash(uploaded_file) -> str:
+    """Hash do upload; só recalcula quando o arquivo muda (não a cada rerun do Streamlit)."""
+    return get_hash_cache().hash_upload(uploaded_file)
 
 def normalize_hash(h: str) -> str:
     """Aceita hash com ou sem 0x e devolve no formato 0x + 64 hex."""
@@ -74,9 +93,18 @@ def format_timestamp(ts: int) -> str:
 # ---------------------------
 
 @st.cache_resource
+def get_provider_pool():
+    """Pool de nós RPC compartilhado entre sessões (health check + failover)."""
+    return ProviderPool(rpc_urls(GANACHE_URL))
+
 def connect_web3():
-    w3 = Web3(Web3.HTTPProvider(GANACHE_URL))
-    return w3
+    """Web3 do melhor nó disponível no momento."""
+    return get_provider_pool().primary()
+
+@st.cache_resource
+def load_signer_pool():
+    """Pool de assinantes (conta padrão + keystore), compartilhado entre sessões."""
+    return build_signer_pool(ACCOUNT_ADDRESS, PRIVATE_KEY)
 
 def load_inventario_contract(w3):
     if not os.path.exists(ABI_INVENTARIO_PATH):
@@ -100,12 +128,8 @@ def _select_contract(w3, contract_type: str):
     else:
         raise ValueError("Tipo de contrato inválido")
 
-def send_transaction(contract_type: str, function_name: str, *args):
-    """
-    Constrói, assina e envia transação para o contrato selecionado.
-    Retorna o receipt.
-    """
-    w3 = connect_web3()
+def _build_call(w3, contract_type: str, function_name: str, args):
+    """ContractFunction pronta para assinar (usada também no replay da fila local)."""
     contract = _select_contract(w3, contract_type)
 
     # ajusta argumentos automáticos (converter hash hex -> bytes32 quando necessário)
@@ -118,44 +142,48 @@ def send_transaction(contract_type: str, function_name: str, *args):
 
     # procura função no contrato
     try:
-        fn = getattr(contract.functions, function_name)(*processed_args)
+        return getattr(contract.functions, function_name)(*processed_args)
     except Exception as e:
         raise Exception(f"Função '{function_name}' não encontrada no contrato ABI. ({e})")
 
-    nonce = w3.eth.get_transaction_count(ACCOUNT_ADDRESS)
-    tx = fn.build_transaction({
-        "from": ACCOUNT_ADDRESS,
-        "nonce": nonce,
-        "gas": 3000000,
-        "gasPrice": w3.to_wei("1", "gwei"),
-    })
+@st.cache_resource
+def get_outbox():
+    """Fila local persistente de escritas + flusher em segundo plano (um por processo)."""
+    outbox = Outbox(OUTBOX_PATH, _build_call, load_signer_pool(), get_provider_pool())
+    outbox.start()
+    return outbox
 
-    signed = w3.eth.account.sign_transaction(tx, private_key=PRIVATE_KEY)
+def send_transaction(contract_type: str, function_name: str, *args, sender: str = None):
+    """
+    Grava a chamada na fila local e aguarda o envio ao contrato selecionado.
+    `sender` escolhe o quartel que assina (padrão: ACCOUNT_ADDRESS).
+    Retorna o receipt, ou None se o nó estiver indisponível — a chamada fica na fila
+    e será enviada (uma única vez) quando o nó voltar.
+    """
+    outbox = get_outbox()
+    row_id = outbox.enqueue(contract_type, function_name, args, sender=sender)
+    row = outbox.wait(row_id, timeout=OUTBOX_WAIT)
+
+    if row["status"] == FALHOU:
+        raise Exception(f"Erro ao enviar transação: {row['error']}")
+    if row["status"] == REVERTIDO:
+        raise Exception(f"Transação revertida pelo contrato: {row['error']} (Tx: {row['tx_hash']})")
+    if row["status"] != CONFIRMADO:
+        return None
+    return get_provider_pool().wait_for_receipt(row["tx_hash"])
 
-    # ATTENÇÃO: Web3.py SignedTransaction possui atributo raw_transaction
-    try:
-        tx_hash = w3.eth.send_raw_transaction(signed.raw_transaction)
-    except AttributeError:
+def call_contract(contract_type: str, function_name: str, *args):
+    """Chamada de leitura (view), balanceada entre os nós RPC."""
+    def _call(w3):
+        contract = _select_contract(w3, contract_type)
         try:
-            tx_hash = w3.eth.send_raw_transaction(signed.rawTransaction)
+            fn = getattr(contract.functions, function_name)
         except Exception as e:
-            raise Exception(f"Erro ao enviar transação (atributo raw): {e}")
-    except Exception as e:
-        raise Exception(f"Erro ao enviar transação: {e}")
-
-    receipt = w3.eth.wait_for_transaction_receipt(tx_hash)
-    return receipt
+            raise Exception(f"Função '{function_name}' não encontrada no contrato ABI. ({e})")
+        return fn(*args).call()
 
-def call_contract(contract_type: str, function_name: str, *args):
-    """Chamada de leitura (view)."""
-    w3 = connect_web3()
-    contract = _select_contract(w3, contract_type)
     try:
-        fn = getattr(contract.functions, function_name)
-    except Exception as e:
-        raise Exception(f"Função '{function_name}' não encontrada no contrato ABI. ({e})")
-    try:
-        return fn(*args).call()
+        return get_provider_pool().read(_call)
     except Exception as e:
         raise Exception(e)
 
@@ -163,56 +191,50 @@ def call_contract(contract_type: str, function_name: str, *args):
 # Helpers específicos para operações
 # ---------------------------
 
+@st.cache_resource
+def get_ops_table():
+    """Tabela colunar de todas as operações, compartilhada entre sessões e atualizada incrementalmente."""
+    return OperationsTable()
+
+def _fetch_operation_logs(from_block: int, to_block: int, topics):
+    """Logs dos eventos de operação do HefestoLogistica em [from_block, to_block]."""
+    address = Web3.to_checksum_address(CONTRACT_LOGISTICA_ADDRESS)
+    return get_provider_pool().read(
+        lambda w3: w3.eth.get_logs({
+            "address": address, "fromBlock": from_block, "toBlock": to_block, "topics": [topics],
+        }),
+        min_block=to_block,
+    )
+
+def sync_ops_table():
+    """Aplica os eventos novos e relê algumas pendentes (cancelamentos). Retorna (tabela, {op_id: erro})."""
+    try:
+        head = get_provider_pool().read(lambda w3: w3.eth.block_number)
+    except Exception as e:
+        raise Exception(f"Falha ao consultar o bloco atual: {e}")
+
+    table = get_ops_table()
+    try:
+        errors = table.sync(head, _fetch_operation_logs,
+                            lambda op_id: call_contract("logistica", "getOperation", op_id))
+    except Exception as e:
+        raise Exception(f"Falha ao ler eventos de operação: {e}")
+    return table, errors
+
 def load_operations_pending():
     """
     Carrega operações pendentes do contrato de logística.
     Retorna lista de dicionários com campos prontos para exibição.
     """
+    table, errors = sync_ops_table()
     ops = []
-    try:
-        total_ops = call_contract("logistica", "operacaoCount")
-    except Exception as e:
-        raise Exception(f"Falha ao consultar operacaoCount: {e}")
-
-    try:
-        total_ops_int = int(total_ops)
-    except Exception:
-        total_ops_int = 0
-
-    for op_id in range(1, total_ops_int + 1):
-        try:
-            op = call_contract("logistica", "getOperation", op_id)
-            origem = op[0]
-            destino = op[1]
-            hash_item = op[2].hex() if hasattr(op[2], "hex") else str(op[2])
-            origemAprovou = op[3]
-            destinoAprovou = op[4]
-            status_idx = int(op[5])
-            createdAt = op[6]
-
-            status_map = {
-                0: "None",
-                1: "Pendente",
-                2: "Aprovado",
-                3: "Emergencial"
-            }
-            status_text = status_map.get(status_idx, f"Desconhecido({status_idx})")
-
-            if status_text == "Pendente":
-                ops.append({
-                    "ID": op_id,
-                    "Origem": origem,
-                    "Destino": destino,
-                    "Hash": hash_item,
-                    "OrigemAprovou": origemAprovou,
-                    "DestinoAprovou": destinoAprovou,
-                    "StatusIdx": status_idx,
-                    "Status": status_text,
-                    "CriadoEm": createdAt,
-                    "CriadoEmFmt": format_timestamp(createdAt),
-                })
-        except Exception as e:
-            ops.append({"ID": op_id, "Erro": str(e)})
+    for op_id in table.pending_ids().tolist():
+        row = table.row(op_id)
+        row["CriadoEmFmt"] = format_timestamp(row["CriadoEm"])
+        del row["ConcluidoEm"]
+        ops.append(row)
+    for op_id, msg in errors.items():
+        ops.append({"ID": op_id, "Erro": msg})
     return ops
 
 def refresh_ops_state():
@@ -242,7 +264,13 @@ if 'ops_error' not in st.session_state:
 # Sidebar
 st.sidebar.title("🪖 Projeto Hefesto")
 st.sidebar.write("Navegue entre as áreas")
-page = st.sidebar.radio("Menu", ["📦 Inventário", "🚚 Operações", "🔎 Consultas", "🛡️ Aprovação Militar"], label_visibility="collapsed")
+try:
+    _backlog = get_outbox().backlog()
+    if _backlog:
+        st.sidebar.caption(f"📥 Fila local: {_backlog} transação(ões) aguardando envio")
+except Exception as e:
+    st.sidebar.warning(f"Fila local indisponível: {e}")
+page = st.sidebar.radio("Menu", ["📦 Inventário", "🚚 Operações", "🔎 Consultas", "📊 Painel", "🛡️ Aprovação Militar"], label_visibility="collapsed")
 
 # ---------------------------
 # PÁGINA: INVENTÁRIO
@@ -266,8 +294,7 @@ if page == "📦 Inventário":
     hash_gerado = None
     if uploaded_file:
         try:
-            file_bytes = uploaded_file.read()
-            hash_gerado = calc_hash(file_bytes)
+            hash_gerado = calc_upload_hash(uploaded_file)
             st.success(f"Hash do arquivo (SHA-256): `{hash_gerado}`")
         except Exception as e:
             st.error(f"Erro ao ler arquivo: {e}")
@@ -288,12 +315,15 @@ if page == "📦 Inventário":
                     modelo,
                     estado
                 )
-                st.success("✅ Item registrado na blockchain!")
-                st.json({
-                    "blockNumber": receipt.blockNumber,
-                    "transactionHash": receipt.transactionHash.hex(),
-                    "gasUsed": receipt.gasUsed,
-                })
+                if receipt is None:
+                    st.info(QUEUED_MSG)
+                else:
+                    st.success("✅ Item registrado na blockchain!")
+                    st.json({
+                        "blockNumber": receipt.blockNumber,
+                        "transactionHash": receipt.transactionHash.hex(),
+                        "gasUsed": receipt.gasUsed,
+                    })
             except Exception as e:
                 msg = str(e)
                 if "Item ja registrado" in msg or "Item ja cadastrado" in msg:
@@ -370,14 +400,15 @@ elif page == "🚚 Operações":
         "0x99c38E10D0F050aF2D728594c4c5EF74d72E4D84",
         "0xBeF7c563b1E211EdADe2e465991447a6B9f14e6f"
     ])
+    if not load_signer_pool().has(origem):
+        st.warning("⚠ Quartel de origem sem chave no keystore local — a operação não poderá ser assinada por ele.")
     lote_id = st.text_input("Identificador do lote (número de série do lote)")
     modalidade = st.selectbox("Modalidade", ["Transferência", "Recebido", "Enviado"])
 
     hash_lote = None
     if uploaded_file2:
         try:
-            fb = uploaded_file2.read()
-            hash_lote = calc_hash(fb)
+            hash_lote = calc_upload_hash(uploaded_file2)
             st.success(f"Hash do lote: `{hash_lote}`")
         except Exception as e:
             st.error(f"Erro ao ler arquivo: {e}")
@@ -398,13 +429,17 @@ elif page == "🚚 Operações":
                     lote_id,
                     "Operacao",
                     modelo_field,
-                    modalidade
+                    modalidade,
+                    sender=origem
                 )
-                st.success("🚚 Operação registrada (armazenada como item).")
-                st.json({
-                    "blockNumber": receipt.blockNumber,
-                    "transactionHash": receipt.transactionHash.hex()
-                })
+                if receipt is None:
+                    st.info(QUEUED_MSG)
+                else:
+                    st.success("🚚 Operação registrada (armazenada como item).")
+                    st.json({
+                        "blockNumber": receipt.blockNumber,
+                        "transactionHash": receipt.transactionHash.hex()
+                    })
             except Exception as e:
                 msg = str(e)
                 if "Item ja registrado" in msg or "Item ja cadastrado" in msg or "Item ja" in msg:
@@ -420,13 +455,17 @@ elif page == "🚚 Operações":
                     "logistica",
                     "createOperation",
                     Web3.to_checksum_address(destino),
-                    hash_lote
+                    hash_lote,
+                    sender=origem
                 )
-                st.success("✅ Operação criada no contrato de logística para aprovação.")
-                st.json({
-                    "op_blockNumber": op_receipt.blockNumber,
-                    "op_transactionHash": op_receipt.transactionHash.hex()
-                })
+                if op_receipt is None:
+                    st.info(QUEUED_MSG)
+                else:
+                    st.success("✅ Operação criada no contrato de logística para aprovação.")
+                    st.json({
+                        "op_blockNumber": op_receipt.blockNumber,
+                        "op_transactionHash": op_receipt.transactionHash.hex()
+                    })
             except Exception as e2:
                 st.error("Falha ao criar operação no contrato de logística.")
                 st.code(str(e2))
@@ -467,6 +506,70 @@ elif page == "🔎 Consultas":
     st.markdown("---")
     st.write("Consulta por ID do lote / lista de inventário disponível em `Inventário -> Carregar inventário`.")
 
+# ---------------------------
+# PÁGINA: PAINEL (agregados sobre todas as operações)
+# ---------------------------
+elif page == "📊 Painel":
+    st.title("📊 Painel de Operações")
+    st.write("Visão agregada de todas as operações do contrato de logística.")
+    st.markdown("---")
+
+    if st.button("Atualizar", key="refresh_dashboard"):
+        try:
+            _, sync_errors = sync_ops_table()
+            if sync_errors:
+                st.warning(f"{len(sync_errors)} operação(ões) não puderam ser lidas; serão tentadas de novo.")
+        except Exception as e:
+            st.error("Erro ao atualizar operações.")
+            st.code(str(e))
+
+    table = get_ops_table()
+    if table.size == 0:
+        st.info("Nenhuma operação carregada. Clique em 'Atualizar'.")
+    else:
+        by_status = table.counts_by_status()
+        latency = table.latency_summary()
+
+        m1, m2, m3, m4 = st.columns(4)
+        m1.metric("Operações", table.size)
+        m2.metric("Pendentes", by_status["Pendente"])
+        m3.metric("Concluídas", by_status["Aprovado"] + by_status["Emergencial"])
+        m4.metric("Taxa de emergência", f"{table.emergency_rate():.1%}")
+
+        st.subheader("Operações por status")
+        st.bar_chart({"Operações": by_status})
+
+        st.subheader("Operações por quartel")
+        side = st.radio("Agrupar por", ["origem", "destino"], horizontal=True, key="dash_side")
+        st.table([
+            {"Quartel": address, **counts, "Total": total}
+            for address, counts, total in table.counts_by_unit(side)
+        ])
+
+        st.subheader("Latência de aprovação (completedAt − createdAt)")
+        if latency["n"] == 0:
+            st.info("Nenhuma operação concluída ainda.")
+        else:
+            l1, l2, l3, l4 = st.columns(4)
+            l1.metric("p50", f"{latency['p50']:.0f} s")
+            l2.metric("p90", f"{latency['p90']:.0f} s")
+            l3.metric("p99", f"{latency['p99']:.0f} s")
+            l4.metric("máx", f"{latency['max']} s")
+            counts, edges = table.latency_histogram(bins=20)
+            # uma linha por faixa: bordas como coluna (faixas estreitas não colidem no eixo x)
+            st.bar_chart({
+                "Início da faixa (s)": [float(e) for e in edges[:-1]],
+                "Operações": [int(c) for c in counts],
+            }, x="Início da faixa (s)", y="Operações")
+
+        st.subheader("Taxa de emergência por quartel de origem")
+        st.table([
+            {"Quartel": address, "Concluídas": done, "Emergenciais (%)": f"{rate:.1%}"}
+            for address, rate, done in table.emergency_rate_by_unit("origem")
+        ])
+
+        st.caption(f"Tabela colunar: {table.size} operações, {table.nbytes() / 1024:.0f} KiB.")
+
 # ---------------------------
 # PÁGINA: APROVAÇÃO MILITAR (OPÇÃO B — CARDS, ADMIN PODE APROVAR)
 # ---------------------------
@@ -543,18 +646,24 @@ elif page == "🛡️ Aprovação Militar":
                 if c4.button("Aprovar", key=approve_key):
                     try:
                         receipt = send_transaction("logistica", "emergencyAuthorize", op_id)
-                        st.success(f"Operação {op_id} aprovada (emergencial). Tx: {receipt.transactionHash.hex()}")
-                        refresh_ops_state()
-                        st.rerun()
+                        if receipt is None:
+                            st.info(QUEUED_MSG)
+                        else:
+                            st.success(f"Operação {op_id} aprovada (emergencial). Tx: {receipt.transactionHash.hex()}")
+                            refresh_ops_state()
+                            st.rerun()
                     except Exception as e:
                         st.error(f"Erro ao aprovar operação {op_id}: {e}")
 
                 if c4.button("Reprovar", key=reject_key):
                     try:
                         receipt = send_transaction("logistica", "_for_testing_cancelOperation", op_id)
-                        st.warning(f"Operação {op_id} cancelada/reprovada. Tx: {receipt.transactionHash.hex()}")
-                        refresh_ops_state()
-                        st.rerun()
+                        if receipt is None:
+                            st.info(QUEUED_MSG)
+                        else:
+                            st.warning(f"Operação {op_id} cancelada/reprovada. Tx: {receipt.transactionHash.hex()}")
+                            refresh_ops_state()
+                            st.rerun()
                     except Exception as e:
                         st.error(f"Erro ao reprovar/cancelar operação {op_id}: {e}")
 
@@ -1,8 +1,13 @@
 import streamlit as st
 from web3 import Web3
-import hashlib
 import json
 import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "python"))
+from signers import build_signer_pool
+from hash_cache import HashCache
+from providers import ProviderPool, rpc_urls
 
 # =============================
 # CONFIGURAÇÕES
@@ -41,11 +46,26 @@ st.markdown('<div class="hud-right"></div>', unsafe_allow_html=True)
 # =============================
 
 @st.cache_resource
-def connect_web3():
-    w3 = Web3(Web3.HTTPProvider(GANACHE_URL))
-    if not w3.is_connected():
+def get_provider_pool():
+    pool = ProviderPool(rpc_urls(GANACHE_URL))
+    pool.refresh(force=True)
+    if not any(n.healthy for n in pool.nodes):
         st.error("❌ Não conectado ao Ganache")
-    return w3
+    return pool
+
+
+def connect_web3():
+    return get_provider_pool().primary()
+
+
+@st.cache_resource
+def load_signer_pool():
+    return build_signer_pool(ACCOUNT_ADDRESS, PRIVATE_KEY)
+
+
+@st.cache_resource
+def get_hash_cache():
+    return HashCache()
 
 
 def load_contract(w3):
@@ -62,31 +82,23 @@ def load_contract(w3):
 # FUNÇÕES DE CONTRATO
 # =============================
 
-def send_transaction(function_name, *args):
-    w3 = connect_web3()
+def send_transaction(function_name, *args, sender=None):
+    pool = get_provider_pool()
+    w3 = pool.primary()
     contract = load_contract(w3)
 
     fn = getattr(contract.functions, function_name)(*args)
-    nonce = w3.eth.get_transaction_count(ACCOUNT_ADDRESS)
-
-    tx = fn.build_transaction({
-        "from": ACCOUNT_ADDRESS,
-        "nonce": nonce,
-        "gas": 3000000,
-        "gasPrice": w3.to_wei("1", "gwei")
-    })
-
-    signed = w3.eth.account.sign_transaction(tx, PRIVATE_KEY)
-    tx_hash = w3.eth.send_raw_transaction(signed.raw_transaction)
-    receipt = w3.eth.wait_for_transaction_receipt(tx_hash)
+    tx_hash = load_signer_pool().send(w3, fn, sender=sender, submit=pool.send_raw_transaction)
+    receipt = pool.wait_for_receipt(tx_hash)
     return receipt
 
 
 def call_contract(function_name, *args):
-    w3 = connect_web3()
-    contract = load_contract(w3)
-    fn = getattr(contract.functions, function_name)
-    return fn(*args).call()
+    def _call(w3):
+        contract = load_contract(w3)
+        fn = getattr(contract.functions, function_name)
+        return fn(*args).call()
+    return get_provider_pool().read(_call)
 
 
 # =============================
@@ -106,9 +118,7 @@ st.header("📁 Registrar arquivo no Blockchain")
 uploaded_file = st.file_uploader("Envie um arquivo", type=None)
 
 if uploaded_file:
-    file_bytes = uploaded_file.read()
-    hash_hex = hashlib.sha256(file_bytes).hexdigest()
-    hash_bytes32 = "0x" + hash_hex
+    hash_bytes32 = get_hash_cache().hash_upload(uploaded_file)
 
     st.success(f"Hash gerado:\n`{hash_bytes32}`")
 
@@ -0,0 +1,413 @@
+# audit_export.py — exportação incremental de auditoria (itens, operações e eventos) para NDJSON/Parquet
+#
+# Cada execução lê apenas os blocos desde o último checkpoint, em faixas de --lote-blocos, e grava:
+#   events.ndjson      todos os eventos dos contratos (RoleSet, AdminTransferred, ItemRegistrado, Operacao*)
+#   items.ndjson       itens registrados (ItemRegistrado), com os campos do inventário quando disponíveis
+#   operations.ndjson  estado de cada operação tocada na faixa (getOperation no bloco final da faixa)
+# e, com --parquet, uma parte por execução em <tabela>/part-<de>-<ate>.parquet com row groups limitados.
+#
+# Memória constante: no máximo --row-group linhas por tabela ficam em buffer.
+# Exatamente uma vez: o checkpoint guarda o último bloco, o tamanho de cada NDJSON e os nomes das partes
+# Parquet; as partes só recebem o nome final depois de o checkpoint estar salvo. Uma execução interrompida
+# é desfeita na próxima antes de recomeçar: NDJSON truncado, partes fora do checkpoint removidas e partes
+# .tmp já listadas no checkpoint renomeadas.
+#
+# Exemplo (exportação noturna):
+#   python audit_export.py --saida ../auditoria --parquet
+import argparse
+import json
+import os
+import time
+
+from web3 import Web3
+
+from providers import ProviderPool, rpc_urls
+
+# ---------------------------
+# CONFIGURAÇÕES (padrões do PoC)
+# ---------------------------
+
+GANACHE_URL = "http://127.0.0.1:7545"
+CONTRACT_LOGISTICA_ADDRESS = "0x0aB8478A571D6a81B4f5295EFa196Ac16b05541a"
+CONTRACT_INVENTARIO_ADDRESS = "0x874fec5B9ec68D60DD4F749687b98bfA9a1a0f72"
+
+ABI_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "abis")
+ABI_LOGISTICA_PATH = os.path.join(ABI_DIR, "HefestoLogistica.json")
+ABI_INVENTARIO_PATH = os.path.join(ABI_DIR, "HefestoInventario.json")
+
+CHECKPOINT_FILE = "checkpoint.json"
+TABLES = ("events", "items", "operations")
+
+DEFAULT_BLOCK_BATCH = 2000
+DEFAULT_ROW_GROUP = 50000
+
+OPERATION_EVENTS = ("OperacaoCriada", "OperacaoAprovada", "OperacaoConcluida", "OperacaoEmergencia")
+
+
+def _jsonable(value):
+    """Converte bytes/HexBytes/AttributeDict em tipos JSON."""
+    if isinstance(value, (bytes, bytearray)):
+        return "0x" + bytes(value).hex()
+    if isinstance(value, dict) or hasattr(value, "items"):
+        return {k: _jsonable(v) for k, v in dict(value).items()}
+    if isinstance(value, (list, tuple)):
+        return [_jsonable(v) for v in value]
+    return value
+
+
+def _cell(value):
+    """Valor de coluna Parquet: dict/list -> string JSON."""
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, ensure_ascii=False)
+    return value
+
+
+def _event_signature(abi_entry) -> str:
+    types = ",".join(i["type"] for i in abi_entry["inputs"])
+    return f"{abi_entry['name']}({types})"
+
+
+# ---------------------------
+# CHECKPOINT
+# ---------------------------
+
+def load_checkpoint(out_dir: str) -> dict:
+    path = os.path.join(out_dir, CHECKPOINT_FILE)
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {"ultimo_bloco": -1, "ndjson_bytes": {}, "partes": {}}
+
+
+def save_checkpoint(out_dir: str, checkpoint: dict):
+    path = os.path.join(out_dir, CHECKPOINT_FILE)
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(checkpoint, f, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def rollback_incomplete(out_dir: str, checkpoint: dict):
+    """Desfaz o que uma execução interrompida gravou além do checkpoint."""
+    for table in TABLES:
+        path = os.path.join(out_dir, f"{table}.ndjson")
+        size = checkpoint["ndjson_bytes"].get(table, 0)
+        if os.path.exists(path) and os.path.getsize(path) > size:
+            with open(path, "r+b") as f:
+                f.truncate(size)
+        part_dir = os.path.join(out_dir, table)
+        if not os.path.isdir(part_dir):
+            continue
+        # checkpoint antigo, sem a lista de partes: só as .tmp são conhecidamente incompletas
+        listed = checkpoint.get("partes")
+        parts = set(listed.get(table, [])) if listed is not None else None
+        for name in os.listdir(part_dir):
+            full = os.path.join(part_dir, name)
+            if name.endswith(".tmp"):
+                if parts is not None and name[:-len(".tmp")] in parts:
+                    os.replace(full, full[:-len(".tmp")])   # checkpoint salvo, rename interrompido
+                else:
+                    os.remove(full)
+            elif parts is not None and name.endswith(".parquet") and name not in parts:
+                os.remove(full)
+
+
+# ---------------------------
+# ESCRITORES
+# ---------------------------
+
+class TableWriter:
+    """NDJSON (append) + Parquet opcional, com no máximo `row_group` linhas em memória."""
+
+    def __init__(self, out_dir: str, table: str, schema, row_group: int, parquet: bool, label: str):
+        self.table = table
+        self.row_group = row_group
+        self.buffer = []
+        self.rows = 0
+        self.ndjson_path = os.path.join(out_dir, f"{table}.ndjson")
+        self.ndjson = open(self.ndjson_path, "a", encoding="utf-8")
+        self.parquet_writer = None
+        self.part_path = None
+        if parquet:
+            import pyarrow.parquet as pq
+
+            part_dir = os.path.join(out_dir, table)
+            os.makedirs(part_dir, exist_ok=True)
+            self.part_path = os.path.join(part_dir, f"part-{label}.parquet")
+            self.parquet_writer = pq.ParquetWriter(self.part_path + ".tmp", schema)
+            self.schema = schema
+
+    def write(self, row: dict):
+        self.ndjson.write(json.dumps(row, ensure_ascii=False) + "\n")
+        self.rows += 1
+        if self.parquet_writer is not None:
+            self.buffer.append(row)
+            if len(self.buffer) >= self.row_group:
+                self._flush_group()
+
+    def _flush_group(self):
+        import pyarrow as pa
+
+        if not self.buffer:
+            return
+        # objetos (args dos eventos) viram texto JSON na coluna Parquet; no NDJSON ficam aninhados
+        columns = {name: [_cell(r.get(name)) for r in self.buffer] for name in self.schema.names}
+        self.parquet_writer.write_table(pa.Table.from_pydict(columns, schema=self.schema))
+        self.buffer = []
+
+    def close(self) -> int:
+        """Fecha os arquivos (a parte Parquet segue como .tmp até publish()) e devolve o tamanho do NDJSON."""
+        self.ndjson.flush()
+        os.fsync(self.ndjson.fileno())
+        self.ndjson.close()
+        size = os.path.getsize(self.ndjson_path)
+        if self.parquet_writer is not None:
+            self._flush_group()
+            self.parquet_writer.close()
+            if not self.rows:
+                os.remove(self.part_path + ".tmp")
+                self.part_path = None
+        return size
+
+    def publish(self):
+        """Dá o nome final à parte Parquet — só depois de o checkpoint que a lista estar salvo."""
+        if self.part_path is not None:
+            os.replace(self.part_path + ".tmp", self.part_path)
+
+
+def parquet_schemas():
+    import pyarrow as pa
+
+    return {
+        "events": pa.schema([
+            ("contrato", pa.string()), ("evento", pa.string()), ("bloco", pa.int64()),
+            ("timestamp", pa.int64()), ("tx_hash", pa.string()), ("log_index", pa.int32()),
+            ("args", pa.string()),
+        ]),
+        "items": pa.schema([
+            ("contrato", pa.string()), ("hash", pa.string()), ("registrado_por", pa.string()),
+            ("timestamp", pa.int64()), ("bloco", pa.int64()), ("tx_hash", pa.string()),
+            ("numero_serie", pa.string()), ("tipo", pa.string()), ("modelo", pa.string()),
+            ("estado", pa.string()),
+        ]),
+        "operations": pa.schema([
+            ("id", pa.int64()), ("origem", pa.string()), ("destino", pa.string()), ("hash", pa.string()),
+            ("origem_aprovou", pa.bool_()), ("destino_aprovou", pa.bool_()), ("status", pa.int8()),
+            ("created_at", pa.int64()), ("completed_at", pa.int64()), ("bloco_snapshot", pa.int64()),
+        ]),
+    }
+
+
+# ---------------------------
+# EXPORTADOR
+# ---------------------------
+
+class AuditExporter:
+    def __init__(self, pool: ProviderPool, logistica: str, inventario: str = None):
+        self.pool = pool
+        self.contracts = {}   # endereço -> (nome, abi)
+        self.topics = {}      # (endereço, topic0) -> nome do evento
+        self._add("logistica", logistica, ABI_LOGISTICA_PATH)
+        if inventario:
+            self._add("inventario", inventario, ABI_INVENTARIO_PATH)
+
+    def _add(self, name: str, address: str, abi_path: str):
+        with open(abi_path, "r", encoding="utf-8") as f:
+            abi = json.load(f)
+        address = Web3.to_checksum_address(address)
+        self.contracts[address] = (name, abi)
+        for entry in abi:
+            if entry.get("type") == "event":
+                topic = Web3.to_hex(Web3.keccak(text=_event_signature(entry)))
+                self.topics[(address, topic)] = entry["name"]
+
+    def _contract(self, w3, name: str):
+        for address, (n, abi) in self.contracts.items():
+            if n == name:
+                return w3.eth.contract(address=address, abi=abi)
+        return None
+
+    def _decode(self, bound: dict, log):
+        """Decodifica o log com o ABI do contrato emissor; eventos desconhecidos -> (None, None)."""
+        address = Web3.to_checksum_address(log["address"])
+        topic = Web3.to_hex(log["topics"][0]) if log["topics"] else None
+        event_name = self.topics.get((address, topic))
+        if event_name is None:
+            return None, None
+        name, contract = bound[address]
+        return name, getattr(contract.events, event_name)().process_log(log)
+
+    def export_range(self, from_block: int, to_block: int, writers: dict) -> dict:
+        """Exporta [from_block, to_block] e devolve contadores por tabela."""
+        counts = {t: 0 for t in TABLES}
+        addresses = list(self.contracts.keys())
+        logs = self.pool.read(lambda w3: w3.eth.get_logs({
+            "address": addresses, "fromBlock": from_block, "toBlock": to_block,
+        }))
+        block_ts = {}
+        touched_ops = set()
+
+        def timestamp(n):
+            if n not in block_ts:
+                block_ts[n] = self.pool.read(lambda w3: w3.eth.get_block(n)["timestamp"])
+            return block_ts[n]
+
+        w3 = self.pool.primary()
+        bound = {addr: (name, w3.eth.contract(address=addr, abi=abi)) for addr, (name, abi) in self.contracts.items()}
+        for log in logs:
+            contrato, ev = self._decode(bound, log)
+            if ev is None:
+                continue
+            args = _jsonable(ev["args"])
+            block = ev["blockNumber"]
+            tx_hash = Web3.to_hex(ev["transactionHash"])
+            writers["events"].write({
+                "contrato": contrato,
+                "evento": ev["event"],
+                "bloco": block,
+                "timestamp": timestamp(block),
+                "tx_hash": tx_hash,
+                "log_index": ev["logIndex"],
+                "args": args,
+            })
+            counts["events"] += 1
+
+            if ev["event"] == "ItemRegistrado":
+                writers["items"].write(self._item_row(contrato, args, block, tx_hash))
+                counts["items"] += 1
+            elif ev["event"] in OPERATION_EVENTS:
+                touched_ops.add(int(args["id"]))
+
+        # estado das operações tocadas, lido no bloco final da faixa (consistente com os eventos)
+        for op_id in sorted(touched_ops):
+            op = self.pool.read(
+                lambda w3: self._contract(w3, "logistica").functions.getOperation(op_id).call(
+                    block_identifier=to_block),
+                min_block=to_block,
+            )
+            writers["operations"].write({
+                "id": op_id,
+                "origem": op[0],
+                "destino": op[1],
+                "hash": "0x" + bytes(op[2]).hex(),
+                "origem_aprovou": bool(op[3]),
+                "destino_aprovou": bool(op[4]),
+                "status": int(op[5]),
+                "created_at": int(op[6]),
+                "completed_at": int(op[7]),
+                "bloco_snapshot": to_block,
+            })
+            counts["operations"] += 1
+        return counts
+
+    def _item_row(self, contrato: str, args: dict, block: int, tx_hash: str) -> dict:
+        row = {
+            "contrato": contrato,
+            "hash": args["hashItem"],
+            "registrado_por": args["registradoPor"],
+            "timestamp": args["timestamp"],
+            "bloco": block,
+            "tx_hash": tx_hash,
+            "numero_serie": None, "tipo": None, "modelo": None, "estado": None,
+        }
+        if contrato == "inventario":
+            # itens do inventário são imutáveis: os campos descritivos vêm de getItem
+            item = self.pool.read(
+                lambda w3: self._contract(w3, "inventario").functions.getItem(
+                    bytes.fromhex(args["hashItem"][2:])).call()
+            )
+            row.update({"numero_serie": item[1], "tipo": item[2], "modelo": item[3], "estado": item[4]})
+        return row
+
+
+def run(args) -> dict:
+    os.makedirs(args.saida, exist_ok=True)
+    checkpoint = load_checkpoint(args.saida)
+    rollback_incomplete(args.saida, checkpoint)
+
+    urls = [u.strip() for u in args.rpc.split(",") if u.strip()] if args.rpc else rpc_urls(GANACHE_URL)
+    pool = ProviderPool(urls)
+    head = pool.read(lambda w3: w3.eth.block_number) - args.confirmacoes
+    start = max(checkpoint["ultimo_bloco"] + 1, args.desde)
+    if start > head:
+        return {"de": start, "ate": head, "linhas": {t: 0 for t in TABLES}}
+
+    exporter = AuditExporter(pool, args.logistica, args.inventario or None)
+    schemas = parquet_schemas() if args.parquet else {}
+    label = f"{start:012d}-{head:012d}"
+    writers = {
+        t: TableWriter(args.saida, t, schemas.get(t), args.row_group, args.parquet, label) for t in TABLES
+    }
+    totals = {t: 0 for t in TABLES}
+    try:
+        for from_block in range(start, head + 1, args.lote_blocos):
+            to_block = min(from_block + args.lote_blocos - 1, head)
+            counts = exporter.export_range(from_block, to_block, writers)
+            for t in TABLES:
+                totals[t] += counts[t]
+            print(f"  blocos {from_block}-{to_block}: " + ", ".join(f"{t}={counts[t]}" for t in TABLES))
+    except BaseException:
+        # nada é confirmado: a próxima execução trunca o que foi escrito e recomeça de `start`
+        for w in writers.values():
+            w.ndjson.close()
+        raise
+
+    sizes = {t: w.close() for t, w in writers.items()}
+    parts = {t: list(names) for t, names in checkpoint.get("partes", {}).items()}
+    if "partes" not in checkpoint:
+        # checkpoint antigo: adota as partes finais já existentes
+        for t in TABLES:
+            part_dir = os.path.join(args.saida, t)
+            if os.path.isdir(part_dir):
+                parts[t] = sorted(n for n in os.listdir(part_dir) if n.endswith(".parquet"))
+    for t, w in writers.items():
+        if w.part_path is not None:
+            parts.setdefault(t, []).append(os.path.basename(w.part_path))
+    save_checkpoint(args.saida, {
+        "ultimo_bloco": head,
+        "ndjson_bytes": sizes,
+        "partes": parts,
+        "atualizado_em": int(time.time()),
+    })
+    for w in writers.values():
+        w.publish()
+    return {"de": start, "ate": head, "linhas": totals}
+
+
+def parse_args(argv=None):
+    p = argparse.ArgumentParser(description="Exportação incremental de auditoria (NDJSON/Parquet).")
+    p.add_argument("--saida", default="auditoria", help="diretório de saída (guarda também o checkpoint)")
+    p.add_argument("--rpc", default=None,
+                   help="URL(s) RPC separadas por vírgula (padrão: HEFESTO_RPC_URLS ou o Ganache local)")
+    p.add_argument("--logistica", default=CONTRACT_LOGISTICA_ADDRESS, help="endereço do HefestoLogistica")
+    p.add_argument("--inventario", default=CONTRACT_INVENTARIO_ADDRESS,
+                   help="endereço do HefestoInventario ('' para ignorar)")
+    p.add_argument("--parquet", action="store_true", help="grava também partes Parquet (requer pyarrow)")
+    p.add_argument("--lote-blocos", type=int, default=DEFAULT_BLOCK_BATCH, help="blocos por consulta eth_getLogs")
+    p.add_argument("--row-group", type=int, default=DEFAULT_ROW_GROUP, help="linhas por row group Parquet")
+    p.add_argument("--confirmacoes", type=int, default=0, help="ignora os N blocos mais recentes")
+    p.add_argument("--desde", type=int, default=0, help="bloco inicial da primeira exportação")
+    args = p.parse_args(argv)
+    if args.parquet:
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            p.error("--parquet requer pyarrow (pip install pyarrow)")
+    if args.lote_blocos <= 0 or args.row_group <= 0:
+        p.error("--lote-blocos e --row-group devem ser > 0")
+    return args
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    print(f"=== EXPORTAÇÃO DE AUDITORIA -> {args.saida} ===")
+    t0 = time.time()
+    result = run(args)
+    if result["de"] > result["ate"]:
+        print("Nada novo desde o último checkpoint.")
+    else:
+        print(f"✔ Blocos {result['de']}-{result['ate']} exportados em {time.time() - t0:.1f}s: "
+              + ", ".join(f"{t}={n}" for t, n in result["linhas"].items()))
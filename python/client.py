@@ -1,11 +1,16 @@
 from web3 import Web3
 import json
 import os
+import sys
+
+from signers import build_signer_pool
+from hash_cache import HashCache
+from providers import ProviderPool, rpc_urls
 
 # -----------------------------
 # CONFIGURAÇÕES
 # -----------------------------
-GANACHE_URL = "http://127.0.0.1:7545"  # RPC do Ganache
+GANACHE_URL = "http://127.0.0.1:7545"  # RPC do Ganache (vários nós: HEFESTO_RPC_URLS)
 
 # Caminho do ABI do RegistroHash
 ABI_PATH = os.path.join("abis", "RegistroHash.json")
@@ -13,21 +18,46 @@ ABI_PATH = os.path.join("abis", "RegistroHash.json")
 # ENDEREÇO DO CONTRATO — PEGADO DO REMIX
 CONTRACT_ADDRESS = "0x6b91b79Cf5d3e754674c0DC0961D8C0EFdee0118"
 
-# Conta e chave privada do Ganache (correspondentes)
+# Conta e chave privada padrão do Ganache (correspondentes)
+# Demais quartéis: keystore local (ver signers.py)
 PRIVATE_KEY = "0x847f133ca3db2c19254b4f9f244d7415fd30a1952f4cb4bd0b4bcefdfc16cdc2"
 ACCOUNT_ADDRESS = "0x6Abc0B7A1360b6A4fC6c87D0e3a45F4DD9c6E17f"
 
+# Cache de hashes de arquivos locais (caminho, tamanho, mtime) entre execuções
+HASH_CACHE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".hash_cache.json")
+
 
 # -----------------------------
 # CONEXÃO WEB3
 # -----------------------------
+_provider_pool = None
+
+
+def get_provider_pool():
+    global _provider_pool
+    if _provider_pool is None:
+        _provider_pool = ProviderPool(rpc_urls(GANACHE_URL))
+    return _provider_pool
+
+
 def connect_ganache():
-    w3 = Web3(Web3.HTTPProvider(GANACHE_URL))
-    if w3.is_connected():
-        print("✔ Conectado ao Ganache")
+    pool = get_provider_pool()
+    pool.refresh(force=True)
+    if any(n.healthy for n in pool.nodes):
+        print(f"✔ Conectado ao Ganache ({sum(n.healthy for n in pool.nodes)}/{len(pool.nodes)} nós)")
     else:
         raise Exception("❌ Não foi possível conectar ao Ganache")
-    return w3
+    return pool.primary()
+
+
+_signer_pool = None
+
+
+def get_signer_pool():
+    global _signer_pool
+    if _signer_pool is None:
+        _signer_pool = build_signer_pool(ACCOUNT_ADDRESS, PRIVATE_KEY)
+    return _signer_pool
 
 
 # -----------------------------
@@ -48,44 +78,62 @@ def load_contract(w3):
 # FUNÇÃO: leitura (view)
 # -----------------------------
 def call_contract_function(function_name, *args):
-    w3 = connect_ganache()
-    contract = load_contract(w3)
+    def _call(w3):
+        contract = load_contract(w3)
+        fn = getattr(contract.functions, function_name)
+        return fn(*args).call()
 
-    fn = getattr(contract.functions, function_name)
-    result = fn(*args).call()
+    result = get_provider_pool().read(_call)
     return result
 
 
 # -----------------------------
 # FUNÇÃO: transação (escrita)
 # -----------------------------
-def send_transaction(function_name, *args):
-    w3 = connect_ganache()
+def send_transaction(function_name, *args, sender=None):
+    pool = get_provider_pool()
+    w3 = pool.primary()
     contract = load_contract(w3)
 
     fn = getattr(contract.functions, function_name)(*args)
 
-    nonce = w3.eth.get_transaction_count(ACCOUNT_ADDRESS)
-
-    tx = fn.build_transaction({
-        "from": ACCOUNT_ADDRESS,
-        "nonce": nonce,
-        "gas": 3000000,
-        "gasPrice": w3.to_wei("1", "gwei")
-    })
-
-    signed_tx = w3.eth.account.sign_transaction(tx, private_key=PRIVATE_KEY)
-    tx_hash = w3.eth.send_raw_transaction(signed_tx.raw_transaction)
+    # assina com a chave do quartel `sender` (padrão: ACCOUNT_ADDRESS); failover entre nós no envio
+    tx_hash = get_signer_pool().send(w3, fn, sender=sender, submit=pool.send_raw_transaction)
 
-    receipt = w3.eth.wait_for_transaction_receipt(tx_hash)
+    receipt = pool.wait_for_receipt(tx_hash)
     print("✔ Transação executada com sucesso!")
     return receipt
 
 
+# -----------------------------
+# FUNÇÃO: hash de arquivo local
+# -----------------------------
+_hash_cache = None
+
+
+def hash_file(path):
+    """SHA-256 (0x...) de um arquivo local; arquivos inalterados não são relidos."""
+    global _hash_cache
+    if _hash_cache is None:
+        _hash_cache = HashCache()
+        _hash_cache.load(HASH_CACHE_PATH)
+    misses = _hash_cache.misses
+    h = _hash_cache.hash_path(path)
+    if _hash_cache.misses != misses:
+        _hash_cache.save(HASH_CACHE_PATH)
+    return h
+
+
 # -----------------------------
 # TESTE INICIAL
 # -----------------------------
 if __name__ == "__main__":
+    # python client.py [arquivo ...] -> imprime o hash de cada arquivo
+    if len(sys.argv) > 1:
+        for path in sys.argv[1:]:
+            print(f"{hash_file(path)}  {path}")
+        sys.exit(0)
+
     print("\n=== TESTE DE CONEXÃO ===")
     connect_ganache()
     print("\nPronto para registrar hashes.\n")
@@ -0,0 +1,141 @@
+# hash_cache.py — memoização de SHA-256 por identidade do arquivo (upload ou caminho local)
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+# ---------------------------
+# CONFIGURAÇÕES
+# ---------------------------
+
+DEFAULT_MAX_ENTRIES = 512
+DEFAULT_MAX_BYTES = 1 * 1024 * 1024   # memória aproximada ocupada pelas entradas
+
+# bytes lidos do início e do fim do arquivo para a impressão digital barata
+FINGERPRINT_CHUNK = 4096
+
+# leitura em blocos para arquivos locais (não carrega o arquivo inteiro)
+READ_CHUNK = 1024 * 1024
+
+
+def sha256_hex(data) -> str:
+    """SHA-256 no formato 0x... (64 hex). Aceita bytes ou memoryview."""
+    return "0x" + hashlib.sha256(data).hexdigest()
+
+
+def cheap_fingerprint(buf) -> str:
+    """Hash curto do início + fim do conteúdo — detecta troca de arquivo sem ler tudo."""
+    n = len(buf)
+    h = hashlib.blake2b(digest_size=16)
+    h.update(buf[:FINGERPRINT_CHUNK])
+    if n > FINGERPRINT_CHUNK:
+        h.update(buf[max(FINGERPRINT_CHUNK, n - FINGERPRINT_CHUNK):])
+    return h.hexdigest()
+
+
+class HashCache:
+    """
+    Cache LRU chave -> hash "0x...", limitado por número de entradas e por memória aproximada.
+    Seguro para uso entre threads (sessões do Streamlit compartilham a instância).
+    """
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _entry_size(key, value) -> int:
+        return len(repr(key)) + len(value) + 64  # 64 ~ overhead do nó no OrderedDict
+
+    def get(self, key):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value: str):
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= self._entry_size(key, old)
+            self._entries[key] = value
+            self._bytes += self._entry_size(key, value)
+            while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+                k, v = self._entries.popitem(last=False)
+                self._bytes -= self._entry_size(k, v)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    # ---------------------------
+    # Uploads (Streamlit)
+    # ---------------------------
+
+    def hash_upload(self, uploaded_file) -> str:
+        """
+        Hash de um UploadedFile do Streamlit, chaveado por (file_id, tamanho, impressão digital).
+        Usa getbuffer() — sem copiar o conteúdo e sem mexer na posição de leitura.
+        """
+        with uploaded_file.getbuffer() as buf:
+            key = ("upload", getattr(uploaded_file, "file_id", None), len(buf), cheap_fingerprint(buf))
+            value = self.get(key)
+            if value is None:
+                value = sha256_hex(buf)
+                self.put(key, value)
+        return value
+
+    # ---------------------------
+    # Arquivos locais (CLI)
+    # ---------------------------
+
+    def hash_path(self, path: str) -> str:
+        """Hash de um arquivo local, chaveado por (caminho absoluto, tamanho, mtime)."""
+        full = os.path.abspath(path)
+        st = os.stat(full)
+        key = ("path", full, st.st_size, st.st_mtime_ns)
+        value = self.get(key)
+        if value is None:
+            h = hashlib.sha256()
+            with open(full, "rb") as f:
+                for chunk in iter(lambda: f.read(READ_CHUNK), b""):
+                    h.update(chunk)
+            value = "0x" + h.hexdigest()
+            self.put(key, value)
+        return value
+
+    def save(self, filename: str):
+        """Persiste as entradas de caminhos locais (uploads não sobrevivem ao processo)."""
+        with self._lock:
+            rows = [list(k[1:]) + [v] for k, v in self._entries.items() if k[0] == "path"]
+        tmp = filename + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(rows, f)
+        os.replace(tmp, filename)
+
+    def load(self, filename: str):
+        """Recarrega entradas salvas com save(); arquivo ausente ou corrompido é ignorado."""
+        try:
+            with open(filename, "r", encoding="utf-8") as f:
+                rows = json.load(f)
+            # valida tudo antes de inserir: JSON válido com outro formato também conta como corrompido
+            entries = [(("path", str(full), int(size), int(mtime_ns)), str(value))
+                       for full, size, mtime_ns, value in rows]
+        except (FileNotFoundError, ValueError, TypeError):
+            return
+        for key, value in entries:
+            self.put(key, value)
@@ -0,0 +1,413 @@
+# loadgen.py — gerador de carga multi-quartel para o contrato HefestoLogistica
+#
+# Sobe N quartéis virtuais (contas novas, financiadas e com papel Superior) contra uma
+# rede local (Ganache/Anvil) e executa o fluxo logístico em paralelo:
+#   registerItem -> createOperation -> approveOrigin (origem) -> approveDestination (destino)
+#   ou, com probabilidade --emergencia, emergencyAuthorize pelo General (conta admin).
+#
+# Relatório: TPS sustentado por janela, latência de conclusão das operações (p50/p90/p99),
+# taxa de reversão por função (falhas de envio e receipts que não chegaram contam à parte) e uso de CPU/memória do nó ao longo do tempo (psutil, opcional).
+#
+# Exemplo:
+#   python loadgen.py --quarteis 8 --taxa 2 --duracao 120 --node-pid $(pgrep -f ganache)
+import argparse
+import json
+import os
+import queue
+import random
+import threading
+import time
+
+from web3 import Web3
+from eth_account import Account
+
+from providers import ProviderPool, rpc_urls
+from signers import SignerPool
+
+# ---------------------------
+# CONFIGURAÇÕES (padrões do PoC)
+# ---------------------------
+
+GANACHE_URL = "http://127.0.0.1:7545"
+CONTRACT_LOGISTICA_ADDRESS = "0x0aB8478A571D6a81B4f5295EFa196Ac16b05541a"
+ABI_LOGISTICA_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "abis", "HefestoLogistica.json")
+
+# Conta admin/General (deployer do contrato no Ganache do PoC)
+PRIVATE_KEY = "0x847f133ca3db2c19254b4f9f244d7415fd30a1952f4cb4bd0b4bcefdfc16cdc2"
+ACCOUNT_ADDRESS = "0x6Abc0B7A1360b6A4fC6c87D0e3a45F4DD9c6E17f"
+
+ROLE_SUPERIOR = 2
+FUNDING_ETH = 10
+
+STATUS_PENDENTE = 1
+
+
+def percentile(values, p):
+    """Percentil por interpolação linear (sem numpy)."""
+    if not values:
+        return None
+    s = sorted(values)
+    k = (len(s) - 1) * p / 100.0
+    lo = int(k)
+    hi = min(lo + 1, len(s) - 1)
+    return s[lo] + (s[hi] - s[lo]) * (k - lo)
+
+
+# ---------------------------
+# MÉTRICAS
+# ---------------------------
+
+class Metrics:
+    """Acumula resultados das transações e das operações, protegido por lock."""
+
+    def __init__(self, window: float):
+        self.window = window
+        self.lock = threading.Lock()
+        self.started = time.time()
+        self.tx_ok = {}          # função -> confirmadas com status 1
+        self.tx_reverted = {}    # função -> receipt com status 0 (revert real)
+        self.tx_failed = {}      # função -> erro no envio ou receipt que não apareceu
+        self.tx_errors = []      # amostra das últimas mensagens de erro
+        self.worker_errors = 0   # exceções fora de transact (leitura, eventos) em um ciclo de quartel
+        self.confirm_times = []  # instantes de confirmação (para TPS por janela)
+        self.op_latencies = []   # segundos: createOperation enviado -> operação concluída
+        self.op_emergencia = 0
+        self.op_bilateral = 0
+        self.resources = []      # (t, cpu%, rss MB) do nó
+
+    def record_tx(self, fn_name: str, ok: bool, error: str = None):
+        with self.lock:
+            bucket = self.tx_ok if ok else self.tx_reverted
+            bucket[fn_name] = bucket.get(fn_name, 0) + 1
+            if ok:
+                self.confirm_times.append(time.time() - self.started)
+            if error:
+                self.tx_errors = (self.tx_errors + [f"{fn_name}: {error}"])[-20:]
+
+    def record_failure(self, fn_name: str, error: str):
+        """Transação sem receipt (nó recusou, caiu ou não minerou a tempo) — não é revert."""
+        with self.lock:
+            self.tx_failed[fn_name] = self.tx_failed.get(fn_name, 0) + 1
+            self.tx_errors = (self.tx_errors + [f"{fn_name}: {error}"])[-20:]
+
+    def record_worker_error(self, where: str, error: str):
+        with self.lock:
+            self.worker_errors += 1
+            self.tx_errors = (self.tx_errors + [f"{where}: {error}"])[-20:]
+
+    def record_op(self, latency: float, emergencia: bool):
+        with self.lock:
+            self.op_latencies.append(latency)
+            if emergencia:
+                self.op_emergencia += 1
+            else:
+                self.op_bilateral += 1
+
+    def record_resources(self, cpu: float, rss_mb: float):
+        with self.lock:
+            self.resources.append((time.time() - self.started, cpu, rss_mb))
+
+    def tps_windows(self):
+        """Lista [(início da janela, tps)] com as confirmações agrupadas por janela."""
+        with self.lock:
+            times = list(self.confirm_times)
+        if not times:
+            return []
+        buckets = {}
+        for t in times:
+            b = int(t // self.window)
+            buckets[b] = buckets.get(b, 0) + 1
+        last = max(buckets)
+        return [(b * self.window, buckets.get(b, 0) / self.window) for b in range(last + 1)]
+
+    def report(self) -> dict:
+        elapsed = time.time() - self.started
+        windows = self.tps_windows()
+        # descarta a primeira e a última janela (aquecimento / parcial) quando houver dados suficientes
+        steady = [tps for _, tps in windows[1:-1]] if len(windows) > 2 else [tps for _, tps in windows]
+        with self.lock:
+            funcs = sorted(set(self.tx_ok) | set(self.tx_reverted) | set(self.tx_failed))
+            reverts = {}
+            for f in funcs:
+                ok = self.tx_ok.get(f, 0)
+                bad = self.tx_reverted.get(f, 0)
+                reverts[f] = {"ok": ok, "revertidas": bad, "falhas_envio": self.tx_failed.get(f, 0),
+                              "taxa": round(bad / (ok + bad), 4) if ok + bad else 0.0}
+            total_ok = sum(self.tx_ok.values())
+            total_bad = sum(self.tx_reverted.values())
+            total_failed = sum(self.tx_failed.values())
+            lat = list(self.op_latencies)
+            rep = {
+                "duracao_s": round(elapsed, 1),
+                "tx_confirmadas": total_ok,
+                "tx_revertidas": total_bad,
+                "tx_falhas_envio": total_failed,
+                "erros_no_ciclo": self.worker_errors,
+                # só receipts: falha de envio/timeout não diz nada sobre a lógica do contrato
+                "taxa_reversao": round(total_bad / (total_ok + total_bad), 4) if total_ok + total_bad else 0.0,
+                "tps_medio": round(total_ok / elapsed, 2) if elapsed else 0.0,
+                "tps_sustentado": round(sum(steady) / len(steady), 2) if steady else 0.0,
+                "tps_por_janela": [(round(t, 1), round(v, 2)) for t, v in windows],
+                "operacoes_concluidas": len(lat),
+                "operacoes_emergenciais": self.op_emergencia,
+                "operacoes_bilaterais": self.op_bilateral,
+                "latencia_conclusao_s": {
+                    "p50": percentile(lat, 50),
+                    "p90": percentile(lat, 90),
+                    "p99": percentile(lat, 99),
+                    "max": max(lat) if lat else None,
+                },
+                "reversoes_por_funcao": reverts,
+                "ultimos_erros": list(self.tx_errors),
+                "recursos_no": [(round(t, 1), cpu, round(rss, 1)) for t, cpu, rss in self.resources],
+            }
+        return rep
+
+
+# ---------------------------
+# AMOSTRAGEM DE RECURSOS DO NÓ
+# ---------------------------
+
+def resource_sampler(pid: int, metrics: Metrics, interval: float, stop: threading.Event):
+    """Amostra CPU% e RSS do processo do nó. Sem psutil ou sem pid, não faz nada."""
+    if not pid:
+        return
+    try:
+        import psutil
+    except ImportError:
+        print("⚠ psutil não instalado — uso de recursos do nó não será medido.")
+        return
+    try:
+        proc = psutil.Process(pid)
+        proc.cpu_percent(None)
+    except Exception as e:
+        print(f"⚠ Não foi possível acompanhar o processo {pid}: {e}")
+        return
+    while not stop.wait(interval):
+        try:
+            metrics.record_resources(proc.cpu_percent(None), proc.memory_info().rss / (1024 * 1024))
+        except Exception:
+            return
+
+
+# ---------------------------
+# QUARTÉIS VIRTUAIS
+# ---------------------------
+
+class LoadRun:
+    """Estado compartilhado de uma execução: conexão, contrato, assinantes e filas de aprovação."""
+
+    def __init__(self, args):
+        self.args = args
+        urls = [u.strip() for u in args.rpc.split(",") if u.strip()] if args.rpc else rpc_urls(GANACHE_URL)
+        self.pool = ProviderPool(urls, timeout=60)
+        self.pool.refresh(force=True)
+        if not any(n.healthy for n in self.pool.nodes):
+            raise Exception(f"❌ Não foi possível conectar a nenhum nó: {', '.join(urls)}")
+        with open(ABI_LOGISTICA_PATH, "r", encoding="utf-8") as f:
+            abi = json.load(f)
+        # só endereço/ABI/eventos: cada transação usa o nó primário do momento (ver _contract)
+        self.contract = self.pool.primary().eth.contract(address=Web3.to_checksum_address(args.contrato), abi=abi)
+        self.signers = SignerPool(ACCOUNT_ADDRESS)
+        self.signers.add(ACCOUNT_ADDRESS, PRIVATE_KEY)
+        self.admin = Web3.to_checksum_address(ACCOUNT_ADDRESS)
+        self.quarteis = []
+        self.metrics = Metrics(args.janela)
+        self.stop = threading.Event()
+        # aprovações de destino pendentes, uma fila por quartel de destino: (op_id, t_criacao)
+        self.inbox = {}
+
+    def _contract(self, w3):
+        return w3.eth.contract(address=self.contract.address, abi=self.contract.abi)
+
+    def transact(self, fn_name: str, args, sender: str):
+        """Envia `fn_name(*args)` pelo nó primário atual e aguarda o receipt. Retorna o receipt ou None."""
+        try:
+            w3 = self.pool.primary()
+            fn = getattr(self._contract(w3).functions, fn_name)(*args)
+            tx_hash = self.signers.send(w3, fn, sender=sender, submit=self.pool.send_raw_transaction)
+            receipt = self.pool.wait_for_receipt(tx_hash, timeout=120)
+        except Exception as e:
+            self.metrics.record_failure(fn_name, str(e)[:200])
+            return None
+        ok = receipt.status == 1
+        self.metrics.record_tx(fn_name, ok, None if ok else "revertida")
+        return receipt if ok else None
+
+    def setup(self):
+        """Cria as contas dos quartéis, financia e atribui o papel Superior (admin)."""
+        n = self.args.quarteis
+        print(f"Preparando {n} quartéis virtuais...")
+        for _ in range(n):
+            acct = Account.create()
+            self.signers.add(acct.address, "0x" + bytes(acct.key).hex())
+            self.quarteis.append(Web3.to_checksum_address(acct.address))
+            self.inbox[self.quarteis[-1]] = queue.Queue()
+
+        value = Web3.to_wei(FUNDING_ETH, "ether")
+        pending = []
+        for addr in self.quarteis:
+            w3 = self.pool.primary()
+            pending.append(self.signers.transfer(w3, addr, value))
+            pending.append(self.signers.send(w3, self._contract(w3).functions.setRole(addr, ROLE_SUPERIOR)))
+        for h in pending:
+            receipt = self.pool.wait_for_receipt(h, timeout=120)
+            if receipt.status != 1:
+                raise Exception("Falha na preparação (financiamento/setRole). A conta padrão é admin do contrato?")
+        print("✔ Quartéis prontos.")
+
+    def _complete_if_done(self, op_id: int, t0: float, emergencia: bool):
+        op = self.pool.read(lambda w3: self._contract(w3).functions.getOperation(op_id).call())
+        if int(op[5]) != STATUS_PENDENTE and op[7]:
+            self.metrics.record_op(time.time() - t0, emergencia)
+
+    def _worker_rng(self, index: int) -> random.Random:
+        """Sorteios de um quartel: com --seed, cada um tem a própria sequência (independe do escalonamento)."""
+        if self.args.seed is None:
+            return random.Random()
+        return random.Random(self.args.seed * 1_000_003 + index)
+
+    def origin_worker(self, me: str, rng: random.Random):
+        """
+        Ciclo do quartel: registra item, cria operação e aprova a saída (origem).
+        Cada passo aguarda o receipt (malha fechada por quartel): se o nó não acompanha,
+        a taxa efetiva fica abaixo de --taxa e isso aparece no TPS do relatório.
+        """
+        interval = 1.0 / self.args.taxa
+        next_at = time.time() + rng.random() * interval
+        while not self.stop.is_set():
+            try:
+                # atende primeiro as aprovações de destino endereçadas a este quartel
+                self._drain_inbox(me)
+
+                now = time.time()
+                if now < next_at:
+                    self.stop.wait(min(next_at - now, 0.05))
+                    continue
+                next_at += interval
+                self._origin_cycle(me, rng)
+            except Exception as e:
+                # nó indisponível numa leitura, receipt ilegível...: registra e segue com o próximo ciclo
+                self.metrics.record_worker_error(me, str(e)[:200])
+
+    def _origin_cycle(self, me: str, rng: random.Random):
+        destino = rng.choice([q for q in self.quarteis if q != me])
+        hash_item = os.urandom(32)
+        if self.transact("registerItem", (hash_item,), me) is None:
+            return
+
+        t0 = time.time()
+        receipt = self.transact("createOperation", (destino, hash_item), me)
+        if receipt is None:
+            return
+        events = self.contract.events.OperacaoCriada().process_receipt(receipt)
+        if not events:
+            return
+        op_id = events[0]["args"]["id"]
+
+        if rng.random() < self.args.emergencia:
+            if self.transact("emergencyAuthorize", (op_id,), self.admin):
+                self._complete_if_done(op_id, t0, True)
+            return
+
+        if self.transact("approveOrigin", (op_id,), me):
+            self.inbox[destino].put((op_id, t0))
+
+    def _drain_inbox(self, me: str):
+        box = self.inbox[me]
+        while True:
+            try:
+                op_id, t0 = box.get_nowait()
+            except queue.Empty:
+                return
+            if self.transact("approveDestination", (op_id,), me):
+                self._complete_if_done(op_id, t0, False)
+
+    def run(self):
+        self.setup()
+        self.metrics = Metrics(self.args.janela)  # zera métricas da preparação
+        sampler = threading.Thread(
+            target=resource_sampler,
+            args=(self.args.node_pid, self.metrics, self.args.janela, self.stop),
+            daemon=True,
+        )
+        workers = [
+            threading.Thread(target=self.origin_worker, args=(q, self._worker_rng(i)), daemon=True)
+            for i, q in enumerate(self.quarteis)
+        ]
+        sampler.start()
+        for w in workers:
+            w.start()
+
+        print(f"Carga em andamento por {self.args.duracao}s...")
+        deadline = time.time() + self.args.duracao
+        try:
+            while time.time() < deadline:
+                time.sleep(min(self.args.janela, max(0.0, deadline - time.time())))
+                rep = self.metrics.report()
+                print(f"[{rep['duracao_s']:>7}s] tx={rep['tx_confirmadas']} "
+                      f"revert={rep['taxa_reversao']:.2%} falhas={rep['tx_falhas_envio']} tps={rep['tps_medio']} ops={rep['operacoes_concluidas']}")
+        except KeyboardInterrupt:
+            print("Interrompido — encerrando.")
+        self.stop.set()
+        for w in workers:
+            w.join(timeout=150)
+        # aprovações de destino que ficaram na fila ao fim da execução
+        for q in self.quarteis:
+            try:
+                self._drain_inbox(q)
+            except Exception as e:
+                self.metrics.record_worker_error(q, str(e)[:200])
+        return self.metrics.report()
+
+
+def parse_args(argv=None):
+    p = argparse.ArgumentParser(description="Gerador de carga multi-quartel (HefestoLogistica).")
+    p.add_argument("--rpc", default=None,
+                   help="URL(s) RPC separadas por vírgula (padrão: HEFESTO_RPC_URLS ou o Ganache local)")
+    p.add_argument("--contrato", default=CONTRACT_LOGISTICA_ADDRESS, help="endereço do HefestoLogistica")
+    p.add_argument("--quarteis", type=int, default=4, help="número de quartéis virtuais (>= 2)")
+    p.add_argument("--taxa", type=float, default=1.0, help="operações por segundo por quartel")
+    p.add_argument("--emergencia", type=float, default=0.1, help="fração de operações com emergencyAuthorize")
+    p.add_argument("--duracao", type=float, default=60, help="duração da carga em segundos")
+    p.add_argument("--janela", type=float, default=5, help="janela (s) de TPS e de amostragem de recursos")
+    p.add_argument("--node-pid", type=int, default=None, help="PID do ganache/anvil para medir CPU/memória")
+    p.add_argument("--seed", type=int, default=None, help="semente dos sorteios (destino, emergência) de cada quartel")
+    p.add_argument("--saida", default=None, help="grava o relatório completo em JSON")
+    args = p.parse_args(argv)
+    if args.quarteis < 2:
+        p.error("--quarteis deve ser >= 2 (origem e destino distintos)")
+    if args.taxa <= 0:
+        p.error("--taxa deve ser > 0")
+    if not 0.0 <= args.emergencia <= 1.0:
+        p.error("--emergencia deve estar entre 0 e 1")
+    return args
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    report = LoadRun(args).run()
+
+    print("\n=== RELATÓRIO ===")
+    lat = report["latencia_conclusao_s"]
+    fmt = lambda v: "-" if v is None else f"{v:.2f}s"
+    print(f"TPS sustentado: {report['tps_sustentado']}  (médio {report['tps_medio']})")
+    print(f"Transações: {report['tx_confirmadas']} ok / {report['tx_revertidas']} revertidas "
+          f"({report['taxa_reversao']:.2%}) / {report['tx_falhas_envio']} falhas de envio")
+    if report["erros_no_ciclo"]:
+        print(f"Erros fora das transações (leituras/eventos): {report['erros_no_ciclo']}")
+    print(f"Operações concluídas: {report['operacoes_concluidas']} "
+          f"({report['operacoes_emergenciais']} emergenciais)")
+    print(f"Latência de conclusão: p50={fmt(lat['p50'])} p90={fmt(lat['p90'])} "
+          f"p99={fmt(lat['p99'])} max={fmt(lat['max'])}")
+    for f, r in report["reversoes_por_funcao"].items():
+        print(f"  {f:<20} ok={r['ok']:<6} revertidas={r['revertidas']:<6} "
+              f"falhas={r['falhas_envio']:<6} taxa={r['taxa']:.2%}")
+    if report["recursos_no"]:
+        print("Recursos do nó (t, CPU%, RSS MB):")
+        for t, cpu, rss in report["recursos_no"]:
+            print(f"  {t:>7}s  {cpu:>6.1f}%  {rss:>8.1f}")
+    if args.saida:
+        with open(args.saida, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"Relatório salvo em {args.saida}")
@@ -0,0 +1,317 @@
+# ops_table.py — tabela colunar (NumPy) de todas as operações do HefestoLogistica + agregados vetorizados
+#
+# Carga pelos eventos (eth_getLogs em faixas de blocos): OperacaoCriada preenche a linha, OperacaoAprovada
+# as aprovações, OperacaoEmergencia/OperacaoConcluida o desfecho. Cancelamentos (_for_testing_cancelOperation)
+# não emitem evento — só eles exigem getOperation por id, em rodízio sobre as pendentes.
+import threading
+
+import numpy as np
+from web3 import Web3
+
+# ---------------------------
+# CONFIGURAÇÕES
+# ---------------------------
+
+# índice = OpStatus do contrato; status 0 aparece quando a operação foi apagada (_for_testing_cancelOperation)
+STATUS_NAMES = ["Cancelada", "Pendente", "Aprovado", "Emergencial"]
+STATUS_PENDENTE = 1
+STATUS_APROVADO = 2
+STATUS_EMERGENCIAL = 3
+
+NO_UNIT = np.iinfo(np.uint32).max   # origem/destino de operação cancelada antes de ser vista
+
+INITIAL_CAPACITY = 1024
+LOG_BLOCK_BATCH = 2000      # blocos por eth_getLogs
+RECHECK_PER_SYNC = 200      # pendentes relidas com getOperation por sync (detecção de cancelamento)
+
+EVENT_SIGNATURES = {
+    "OperacaoCriada": "OperacaoCriada(uint256,address,address,bytes32,uint256)",
+    "OperacaoAprovada": "OperacaoAprovada(uint256,address,bool,bool,uint256)",
+    "OperacaoEmergencia": "OperacaoEmergencia(uint256,address,uint256)",
+    "OperacaoConcluida": "OperacaoConcluida(uint256,uint256)",
+}
+TOPICS = {bytes(Web3.keccak(text=sig)): name for name, sig in EVENT_SIGNATURES.items()}
+
+
+def _bytes(value) -> bytes:
+    """HexBytes/bytes ou string 0x... -> bytes."""
+    if isinstance(value, str):
+        return bytes.fromhex(value[2:] if value.startswith("0x") else value)
+    return bytes(value)
+
+
+class AddressIndex:
+    """Interna endereços: cada endereço distinto vira um índice uint32 (a string fica guardada uma vez)."""
+
+    def __init__(self):
+        self._index = {}
+        self._raw = {}            # 20 bytes do topic -> índice (evita checksum repetido)
+        self.addresses = []
+
+    def intern(self, address: str) -> int:
+        idx = self._index.get(address)
+        if idx is None:
+            idx = len(self.addresses)
+            self._index[address] = idx
+            self.addresses.append(address)
+        return idx
+
+    def intern_raw(self, raw: bytes) -> int:
+        """Interna um endereço vindo de topic (32 bytes, endereço nos 20 finais)."""
+        raw = raw[-20:]
+        idx = self._raw.get(raw)
+        if idx is None:
+            idx = self.intern(Web3.to_checksum_address("0x" + raw.hex()))
+            self._raw[raw] = idx
+        return idx
+
+    def __len__(self):
+        return len(self.addresses)
+
+
+class OperationsTable:
+    """
+    Todas as operações em colunas NumPy (uma linha por id, linha = id - 1).
+    ~60 bytes por operação: ids/timestamps int64, status uint8, endereços uint32 internados, hash 32 bytes.
+    """
+
+    def __init__(self, capacity: int = INITIAL_CAPACITY):
+        self.addresses = AddressIndex()
+        self.size = 0
+        self.last_block = -1        # último bloco cujos eventos já estão na tabela
+        self.lock = threading.RLock()
+        self._sync_lock = threading.Lock()   # uma sincronização por vez (sessões compartilham a tabela)
+        self._recheck_after = 0     # rodízio da releitura de pendentes
+        self._alloc(capacity)
+
+    def _alloc(self, capacity: int):
+        self.ids = np.zeros(capacity, dtype=np.int64)
+        self.status = np.zeros(capacity, dtype=np.uint8)
+        self.origem = np.zeros(capacity, dtype=np.uint32)
+        self.destino = np.zeros(capacity, dtype=np.uint32)
+        self.origem_aprovou = np.zeros(capacity, dtype=np.bool_)
+        self.destino_aprovou = np.zeros(capacity, dtype=np.bool_)
+        self.created_at = np.zeros(capacity, dtype=np.int64)
+        self.completed_at = np.zeros(capacity, dtype=np.int64)
+        self.hashes = np.zeros(capacity, dtype="S32")
+
+    def _columns(self):
+        return ("ids", "status", "origem", "destino", "origem_aprovou", "destino_aprovou",
+                "created_at", "completed_at", "hashes")
+
+    def _grow(self, needed: int):
+        capacity = len(self.ids)
+        if needed <= capacity:
+            return
+        while capacity < needed:
+            capacity *= 2
+        for name in self._columns():
+            old = getattr(self, name)
+            new = np.zeros(capacity, dtype=old.dtype)
+            new[:self.size] = old[:self.size]
+            setattr(self, name, new)
+
+    # ---------------------------
+    # Carga
+    # ---------------------------
+
+    def upsert(self, op_id: int, op):
+        """Grava/atualiza a linha de `op_id` com a tupla de getOperation()."""
+        row = op_id - 1
+        with self.lock:
+            self._grow(op_id)
+            if op_id > self.size:
+                self.size = op_id
+            status = int(op[5])
+            # struct apagada volta zerada: mantém quartéis, hash e criação já conhecidos;
+            # nunca interna 0x000…0 como quartel
+            keep = status == 0 and self.ids[row] != 0
+            self.ids[row] = op_id
+            if status == 0 and not keep:
+                self.origem[row] = NO_UNIT
+                self.destino[row] = NO_UNIT
+            elif not keep:
+                self.origem[row] = self.addresses.intern(op[0])
+                self.destino[row] = self.addresses.intern(op[1])
+                self.hashes[row] = bytes(op[2])
+                self.created_at[row] = int(op[6])
+            self.origem_aprovou[row] = bool(op[3])
+            self.destino_aprovou[row] = bool(op[4])
+            self.status[row] = status
+            self.completed_at[row] = int(op[7])
+
+    def apply_logs(self, logs):
+        """Aplica logs brutos de eth_getLogs (em ordem de bloco/índice) dos eventos de operação."""
+        with self.lock:
+            for log in logs:
+                topics = log["topics"]
+                name = TOPICS.get(_bytes(topics[0])) if topics else None
+                if name is None:
+                    continue
+                op_id = int.from_bytes(_bytes(topics[1]), "big")
+                row = op_id - 1
+                data = _bytes(log["data"])
+                if name == "OperacaoCriada":
+                    self._grow(op_id)
+                    if op_id > self.size:
+                        self.size = op_id
+                    self.ids[row] = op_id
+                    self.origem[row] = self.addresses.intern_raw(_bytes(topics[2]))
+                    self.destino[row] = self.addresses.intern_raw(_bytes(topics[3]))
+                    self.hashes[row] = data[0:32]
+                    self.created_at[row] = int.from_bytes(data[32:64], "big")
+                    self.origem_aprovou[row] = False
+                    self.destino_aprovou[row] = False
+                    self.status[row] = STATUS_PENDENTE
+                    self.completed_at[row] = 0
+                elif op_id > self.size:
+                    continue   # criação fora das faixas lidas (não deve ocorrer a partir do bloco 0)
+                elif name == "OperacaoAprovada":
+                    self.origem_aprovou[row] = data[63] != 0
+                    self.destino_aprovou[row] = data[95] != 0
+                elif name == "OperacaoEmergencia":
+                    self.status[row] = STATUS_EMERGENCIAL
+                elif name == "OperacaoConcluida":
+                    self.completed_at[row] = int.from_bytes(data[0:32], "big")
+                    if self.status[row] == STATUS_PENDENTE:
+                        self.status[row] = STATUS_APROVADO
+
+    def sync(self, head: int, fetch_logs, fetch_op=None,
+             batch: int = LOG_BLOCK_BATCH, recheck: int = RECHECK_PER_SYNC) -> dict:
+        """
+        Atualização incremental até o bloco `head`: `fetch_logs(de, ate, topics)` devolve os logs
+        (eth_getLogs) das faixas ainda não lidas. Depois, até `recheck` pendentes são relidas com
+        `fetch_op(op_id)` (getOperation) para detectar cancelamentos.
+        Erro em fetch_logs sobe (as faixas anteriores ficam aplicadas). Retorna {op_id: mensagem}
+        com as releituras que falharam.
+        """
+        errors = {}
+        topics = ["0x" + t.hex() for t in TOPICS]
+        with self._sync_lock:
+            for from_block in range(self.last_block + 1, head + 1, batch):
+                to_block = min(from_block + batch - 1, head)
+                self.apply_logs(fetch_logs(from_block, to_block, topics))
+                self.last_block = to_block
+            if fetch_op is None or recheck <= 0:
+                return errors
+            for op_id in self._recheck_ids(recheck):
+                try:
+                    self.upsert(op_id, fetch_op(op_id))
+                except Exception as e:
+                    errors[op_id] = str(e)   # mantém o último estado conhecido
+        return errors
+
+    def _recheck_ids(self, limit: int) -> list:
+        """Próximas `limit` pendentes depois da última relida (volta ao início ao chegar ao fim)."""
+        pending = self.pending_ids()
+        if pending.size == 0:
+            return []
+        ids = np.concatenate([pending[pending > self._recheck_after], pending[pending <= self._recheck_after]])
+        ids = ids[:limit]
+        self._recheck_after = int(ids[-1])
+        return ids.tolist()
+
+    # ---------------------------
+    # Consultas
+    # ---------------------------
+
+    def view(self):
+        """Fatias das colunas até `size` (sem cópia)."""
+        n = self.size
+        return {name: getattr(self, name)[:n] for name in self._columns()}
+
+    def pending_ids(self) -> np.ndarray:
+        with self.lock:
+            return self.ids[:self.size][self.status[:self.size] == STATUS_PENDENTE].copy()
+
+    def _address(self, idx):
+        return None if idx == NO_UNIT else self.addresses.addresses[idx]
+
+    def row(self, op_id: int) -> dict:
+        r = op_id - 1
+        with self.lock:
+            return {
+                "ID": int(self.ids[r]),
+                "Origem": self._address(self.origem[r]),
+                "Destino": self._address(self.destino[r]),
+                "Hash": bytes(self.hashes[r]).ljust(32, b"\0").hex(),
+                "OrigemAprovou": bool(self.origem_aprovou[r]),
+                "DestinoAprovou": bool(self.destino_aprovou[r]),
+                "StatusIdx": int(self.status[r]),
+                "Status": STATUS_NAMES[self.status[r]] if self.status[r] < len(STATUS_NAMES) else f"Desconhecido({self.status[r]})",
+                "CriadoEm": int(self.created_at[r]),
+                "ConcluidoEm": int(self.completed_at[r]),
+            }
+
+    # ---------------------------
+    # Agregados vetorizados
+    # ---------------------------
+
+    def counts_by_status(self) -> dict:
+        with self.lock:
+            counts = np.bincount(self.status[:self.size], minlength=len(STATUS_NAMES))
+        return {name: int(counts[i]) for i, name in enumerate(STATUS_NAMES)}
+
+    def counts_by_unit(self, side: str = "origem") -> list:
+        """
+        Contagem por quartel (origem ou destino) x status; operações canceladas ficam de fora.
+        Retorna [(endereço, {status: contagem}, total)] em ordem decrescente de total.
+        """
+        n_status = len(STATUS_NAMES)
+        with self.lock:
+            live = self.status[:self.size] != 0
+            units = getattr(self, side)[:self.size][live].astype(np.int64)
+            status = self.status[:self.size][live].astype(np.int64)
+            n_units = len(self.addresses)
+            matrix = np.bincount(units * n_status + status, minlength=n_units * n_status)
+            matrix = matrix[:n_units * n_status].reshape(n_units, n_status)
+            addresses = list(self.addresses.addresses)
+        totals = matrix.sum(axis=1)
+        order = np.argsort(-totals, kind="stable")
+        return [
+            (addresses[u], {STATUS_NAMES[s]: int(matrix[u, s]) for s in range(n_status)}, int(totals[u]))
+            for u in order if totals[u] > 0
+        ]
+
+    def approval_latencies(self) -> np.ndarray:
+        """completedAt - createdAt (segundos) das operações concluídas (aprovadas ou emergenciais)."""
+        with self.lock:
+            done = self.completed_at[:self.size] > 0
+            return self.completed_at[:self.size][done] - self.created_at[:self.size][done]
+
+    def latency_summary(self, percentiles=(50, 90, 99)) -> dict:
+        lat = self.approval_latencies()
+        if lat.size == 0:
+            return {"n": 0}
+        values = np.percentile(lat, percentiles)
+        summary = {"n": int(lat.size), "media": float(lat.mean()), "max": int(lat.max())}
+        summary.update({f"p{p}": float(v) for p, v in zip(percentiles, values)})
+        return summary
+
+    def latency_histogram(self, bins: int = 20):
+        """(contagens, bordas) do histograma de latência de aprovação."""
+        lat = self.approval_latencies()
+        if lat.size == 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0)
+        return np.histogram(lat, bins=bins)
+
+    def emergency_rate(self) -> float:
+        """Fração das operações concluídas que foram autorizadas em emergência."""
+        with self.lock:
+            status = self.status[:self.size]
+            emerg = int(np.count_nonzero(status == STATUS_EMERGENCIAL))
+            done = emerg + int(np.count_nonzero(status == STATUS_APROVADO))
+        return emerg / done if done else 0.0
+
+    def emergency_rate_by_unit(self, side: str = "origem") -> list:
+        """[(endereço, taxa de emergência, concluídas)] por quartel."""
+        rows = []
+        for address, counts, _ in self.counts_by_unit(side):
+            done = counts["Aprovado"] + counts["Emergencial"]
+            if done:
+                rows.append((address, counts["Emergencial"] / done, done))
+        return rows
+
+    def nbytes(self) -> int:
+        """Memória ocupada pelas colunas (capacidade alocada)."""
+        return sum(getattr(self, name).nbytes for name in self._columns())
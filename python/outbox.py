@@ -0,0 +1,351 @@
+# outbox.py — fila local persistente (SQLite) de escritas nos contratos, com envio em lotes
+#
+# Ciclo de cada registro:
+#   pendente   -> intenção gravada (contrato, função, argumentos, assinante); nada enviado ainda
+#   assinado   -> transação assinada e gravada (raw + hash + nonce) ANTES do envio
+#   enviado    -> algum nó aceitou o raw; aguardando receipt
+#   confirmado -> receipt com status 1
+#   revertido  -> receipt com status 0 (motivo recuperado reexecutando a chamada no bloco do receipt)
+#   falhou     -> erro do contrato/validação ao montar ou enviar (não adianta repetir)
+#
+# Exatamente uma vez: após "assinado", o replay reenvia sempre o MESMO raw (mesmo nonce), então a
+# chamada não pode ser executada duas vezes. Se o nonce foi consumido por outra transação sem que a
+# nossa tenha sido minerada, ela nunca executou — volta para "pendente" e é assinada de novo.
+# Se o nó rejeita um raw assinado, o nonce dele fica livre e nenhum nonce acima minera. Registros já
+# assinados nunca são renumerados (o raw antigo poderia minerar também): o buraco é preenchido com
+# uma transferência de 0 ETH do assinante para si mesmo, gravada na fila como qualquer outro registro.
+import json
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from web3 import Web3
+from web3.exceptions import TransactionNotFound
+
+from providers import NodeUnavailable, is_transport_error
+
+# ---------------------------
+# CONFIGURAÇÕES
+# ---------------------------
+
+DEFAULT_BATCH = 20        # registros pendentes assinados/enviados por rodada
+DEFAULT_IN_FLIGHT = 8     # máximo de transações enviadas sem receipt
+FLUSH_INTERVAL = 2.0      # segundos entre rodadas do flusher em segundo plano
+
+PENDENTE = "pendente"
+ASSINADO = "assinado"
+ENVIADO = "enviado"
+CONFIRMADO = "confirmado"
+REVERTIDO = "revertido"
+FALHOU = "falhou"
+
+# registro interno que só ocupa um nonce rejeitado (transferência de 0 ETH para si mesmo)
+NONCE_FILLER = "_nonce"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS outbox (
+    id            INTEGER PRIMARY KEY AUTOINCREMENT,
+    contract_type TEXT NOT NULL,
+    function_name TEXT NOT NULL,
+    args          TEXT NOT NULL,
+    sender        TEXT,
+    status        TEXT NOT NULL,
+    nonce         INTEGER,
+    raw_tx        BLOB,
+    tx_hash       TEXT,
+    block_number  INTEGER,
+    attempts      INTEGER NOT NULL DEFAULT 0,
+    error         TEXT,
+    created_at    REAL NOT NULL,
+    updated_at    REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS outbox_status ON outbox(status, id);
+"""
+
+
+class Outbox:
+    """
+    Write-ahead outbox: toda escrita é gravada antes de ir para a rede e reenviada até ter receipt.
+
+    `build_fn(w3, contract_type, function_name, args)` devolve a ContractFunction pronta;
+    `signers` é um SignerPool e `providers` um ProviderPool.
+    """
+
+    def __init__(self, path: str, build_fn, signers, providers,
+                 batch: int = DEFAULT_BATCH, max_in_flight: int = DEFAULT_IN_FLIGHT):
+        self.path = path
+        self.build_fn = build_fn
+        self.signers = signers
+        self.providers = providers
+        self.batch = batch
+        self.max_in_flight = max_in_flight
+        self._lock = threading.RLock()   # uma rodada de flush por vez
+        self._stop = threading.Event()
+        self._thread = None
+        with self._connect() as db:
+            db.executescript(SCHEMA)
+
+    @contextmanager
+    def _connect(self):
+        # autocommit: cada UPDATE é durável assim que retorna (synchronous=FULL)
+        db = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        try:
+            db.row_factory = sqlite3.Row
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=FULL")
+            yield db
+        finally:
+            db.close()
+
+    def _update(self, db, op_id: int, where: dict = None, **fields) -> bool:
+        """
+        Atualiza o registro; com `where`, só se as colunas ainda tiverem esses valores (outro processo
+        pode usar o mesmo arquivo). Retorna se a linha foi alterada.
+        """
+        fields["updated_at"] = time.time()
+        where = where or {}
+        cols = ", ".join(f"{k} = ?" for k in fields)
+        cond = "".join(f" AND {k} = ?" for k in where)
+        cur = db.execute(f"UPDATE outbox SET {cols} WHERE id = ?{cond}",
+                         (*fields.values(), op_id, *where.values()))
+        return cur.rowcount > 0
+
+    # ---------------------------
+    # API
+    # ---------------------------
+
+    def enqueue(self, contract_type: str, function_name: str, args, sender: str = None) -> int:
+        """Grava a intenção de chamada (durável) e devolve o id do registro."""
+        now = time.time()
+        with self._connect() as db:
+            cur = db.execute(
+                "INSERT INTO outbox (contract_type, function_name, args, sender, status, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (contract_type, function_name, json.dumps(list(args)), sender, PENDENTE, now, now),
+            )
+            return cur.lastrowid
+
+    def get(self, op_id: int) -> dict:
+        with self._connect() as db:
+            row = db.execute("SELECT * FROM outbox WHERE id = ?", (op_id,)).fetchone()
+        return dict(row) if row else None
+
+    def counts(self) -> dict:
+        with self._connect() as db:
+            rows = db.execute("SELECT status, COUNT(*) FROM outbox GROUP BY status").fetchall()
+        return {r[0]: r[1] for r in rows}
+
+    def backlog(self) -> int:
+        """Registros ainda sem desfecho (pendente/assinado/enviado)."""
+        c = self.counts()
+        return c.get(PENDENTE, 0) + c.get(ASSINADO, 0) + c.get(ENVIADO, 0)
+
+    def wait(self, op_id: int, timeout: float = 30.0, poll: float = 0.2) -> dict:
+        """Processa a fila até o registro ter desfecho ou o prazo acabar; devolve o registro."""
+        deadline = time.time() + timeout
+        while True:
+            try:
+                self.flush()
+            except NodeUnavailable:
+                pass
+            row = self.get(op_id)
+            if row is None or row["status"] in (CONFIRMADO, REVERTIDO, FALHOU):
+                return row
+            # sem nó saudável não adianta esperar: o registro segue na fila para o flusher
+            if time.time() >= deadline or not self.providers.available():
+                return row
+            time.sleep(poll)
+
+    # ---------------------------
+    # Flush em lotes
+    # ---------------------------
+
+    def flush(self) -> int:
+        """
+        Uma rodada: confere receipts do que está em voo e envia novos registros até
+        `max_in_flight`, no máximo `batch` por rodada. Retorna quantos registros mudaram de estado.
+        """
+        with self._lock, self._connect() as db:
+            changed = self._reconcile(db)
+            in_flight = db.execute(
+                "SELECT COUNT(*) FROM outbox WHERE status IN (?, ?)", (ASSINADO, ENVIADO)
+            ).fetchone()[0]
+            room = min(self.batch, self.max_in_flight - in_flight)
+            if room <= 0:
+                return changed
+            rows = db.execute(
+                "SELECT * FROM outbox WHERE status = ? ORDER BY id LIMIT ?", (PENDENTE, room)
+            ).fetchall()
+            for row in rows:
+                if not self._sign_and_send(db, row):
+                    break   # nó indisponível — o restante fica para a próxima rodada
+                changed += 1
+            return changed
+
+    def _sign_and_send(self, db, row) -> bool:
+        w3 = self.providers.primary()
+        try:
+            fn = self.build_fn(w3, row["contract_type"], row["function_name"], json.loads(row["args"]))
+            addr = self.signers.resolve(row["sender"])
+            lane = self.signers.lane(addr)
+            with lane.lock:
+                nonce = lane.reserve(w3)
+                raw = self.signers.sign(w3, fn, addr, nonce=nonce)
+                tx_hash = Web3.to_hex(Web3.keccak(raw))
+                # grava o raw antes de enviar: a partir daqui só este raw será enviado.
+                # UPDATE condicional = reivindicação atômica; outro processo que compartilha o
+                # arquivo pode ter assinado o registro depois do SELECT (o nonce não é consumido)
+                if not self._update(db, row["id"], where={"status": PENDENTE}, status=ASSINADO, nonce=nonce,
+                                    raw_tx=bytes(raw), tx_hash=tx_hash, sender=addr,
+                                    attempts=row["attempts"] + 1, error=None):
+                    return True
+                lane.advance()
+        except Exception as e:
+            if is_transport_error(e):
+                self.signers.lane(row["sender"]).reset()
+                self._update(db, row["id"], error=str(e)[:500])
+                return False
+            self._update(db, row["id"], status=FALHOU, error=str(e)[:500])
+            return True
+        return self._submit(db, row["id"], raw, addr, nonce)
+
+    def _submit(self, db, op_id: int, raw, sender: str, nonce: int) -> bool:
+        try:
+            self.providers.send_raw_transaction(raw)
+        except Exception as e:
+            msg = str(e).lower()
+            if is_transport_error(e):
+                self._update(db, op_id, error=str(e)[:500])
+                return False
+            if "nonce too low" in msg or "known transaction" in msg:
+                # já minerada ou nonce consumido — _reconcile decide pelo receipt
+                self._update(db, op_id, status=ENVIADO, error=str(e)[:500])
+                return True
+            self._update(db, op_id, status=FALHOU, error=str(e)[:500])
+            self._release_nonce(db, op_id, sender, nonce)
+            return True
+        self._update(db, op_id, status=ENVIADO)
+        return True
+
+    def _release_nonce(self, db, op_id: int, sender: str, nonce: int):
+        """
+        O nó rejeitou o raw de `nonce`: sem ele, nenhum nonce acima é minerado.
+        Sem registros assinados acima, basta reler o nonce do nó; com eles, o buraco é
+        preenchido por uma transferência de 0 ETH, e os raws já assinados continuam valendo.
+        """
+        failed = db.execute("SELECT contract_type FROM outbox WHERE id = ?", (op_id,)).fetchone()
+        later = db.execute(
+            "SELECT COUNT(*) FROM outbox WHERE sender = ? AND status IN (?, ?) AND nonce > ?",
+            (sender, ASSINADO, ENVIADO, nonce),
+        ).fetchone()[0]
+        if not later or failed["contract_type"] == NONCE_FILLER:
+            self.signers.lane(sender).reset()
+            return
+        w3 = self.providers.primary()
+        raw = self.signers.sign_transfer(w3, sender, 0, sender, nonce=nonce)
+        now = time.time()
+        cur = db.execute(
+            "INSERT INTO outbox (contract_type, function_name, args, sender, status, nonce, raw_tx, tx_hash, "
+            "attempts, error, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, 1, ?, ?, ?)",
+            (NONCE_FILLER, "transfer", "[]", sender, ASSINADO, nonce, bytes(raw),
+             Web3.to_hex(Web3.keccak(raw)), f"preenche o nonce do registro {op_id}", now, now),
+        )
+        self._submit(db, cur.lastrowid, raw, sender, nonce)
+
+    def _reconcile(self, db) -> int:
+        """Fecha registros com receipt e reenvia (mesmo raw) os que ainda não foram minerados."""
+        changed = 0
+        rows = db.execute(
+            "SELECT * FROM outbox WHERE status IN (?, ?) ORDER BY id", (ASSINADO, ENVIADO)
+        ).fetchall()
+        for row in rows:
+            # o registro pode ter sido fechado desde a leitura da lista
+            current = db.execute("SELECT status FROM outbox WHERE id = ?", (row["id"],)).fetchone()
+            if current["status"] not in (ASSINADO, ENVIADO):
+                continue
+            # nonce ANTES do receipt, no mesmo nó: se a nossa transação minerar entre as duas
+            # leituras, o receipt já aparece; nonce consumido + receipt ausente = nunca executou
+            # só vale para a assinatura lida: outro processo pode ter fechado ou reassinado o registro
+            signed = {"tx_hash": row["tx_hash"]}
+            w3 = self.providers.primary()
+            try:
+                mined_nonce = w3.eth.get_transaction_count(row["sender"], "latest")
+                receipt = _get_receipt(w3, row["tx_hash"])
+            except Exception as e:
+                if is_transport_error(e):
+                    break
+                raise
+            if receipt is not None:
+                # ler-o-que-escreveu também para as escritas que saem da fila
+                self.providers.observe_block(receipt.blockNumber)
+                if receipt.status == 1:
+                    self._update(db, row["id"], where=signed, status=CONFIRMADO,
+                                 block_number=receipt.blockNumber)
+                else:
+                    self._update(db, row["id"], where=signed, status=REVERTIDO,
+                                 block_number=receipt.blockNumber,
+                                 error=self._revert_reason(w3, row, receipt.blockNumber))
+                changed += 1
+                continue
+            if mined_nonce > row["nonce"]:
+                if row["contract_type"] == NONCE_FILLER:
+                    # o buraco já foi ocupado por outra transação: o preenchimento não é mais necessário
+                    self._update(db, row["id"], where=signed, status=CONFIRMADO,
+                                 error="nonce ocupado por outra transação")
+                    changed += 1
+                    continue
+                # nonce usado por outra transação e a nossa não tem receipt: nunca executou
+                self.signers.lane(row["sender"]).reset()
+                self._update(db, row["id"], where=signed, status=PENDENTE, nonce=None, raw_tx=None,
+                             tx_hash=None, error="nonce consumido por outra transação; reassinando")
+                changed += 1
+                continue
+            if not self._submit(db, row["id"], row["raw_tx"], row["sender"], row["nonce"]):
+                break
+        return changed
+
+    def _revert_reason(self, w3, row, block: int) -> str:
+        """
+        Ganache/anvil só informam o revert pelo status 0 do receipt: a chamada é reexecutada
+        (eth_call) no bloco do receipt para recuperar a mensagem do require.
+        """
+        if row["contract_type"] == NONCE_FILLER:
+            return "transação revertida"
+        try:
+            fn = self.build_fn(w3, row["contract_type"], row["function_name"], json.loads(row["args"]))
+            fn.call({"from": row["sender"]}, block_identifier=block)
+        except Exception as e:
+            return str(e)[:500]
+        return "transação revertida (a chamada não reverte ao ser reexecutada)"
+
+    # ---------------------------
+    # Flusher em segundo plano
+    # ---------------------------
+
+    def start(self, interval: float = FLUSH_INTERVAL):
+        """Inicia thread que esvazia a fila enquanto houver nó saudável."""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+
+        def loop():
+            while not self._stop.wait(interval):
+                try:
+                    self.flush()
+                except Exception:
+                    # nó fora do ar ou erro transitório: tenta de novo na próxima rodada
+                    continue
+
+        self._thread = threading.Thread(target=loop, name="hefesto-outbox", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+
+def _get_receipt(w3, tx_hash: str):
+    try:
+        return w3.eth.get_transaction_receipt(tx_hash)
+    except TransactionNotFound:
+        return None
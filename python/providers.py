@@ -0,0 +1,275 @@
+# providers.py — pool de nós RPC: health check, leitura balanceada por latência e failover de escrita
+import os
+import random
+import threading
+import time
+
+from requests.exceptions import RequestException
+from web3 import Web3
+from web3.exceptions import TransactionNotFound
+
+# ---------------------------
+# CONFIGURAÇÕES
+# ---------------------------
+
+# Lista de nós separada por vírgula, ex.: "http://127.0.0.1:7545,http://127.0.0.1:8546"
+RPC_URLS_ENV = "HEFESTO_RPC_URLS"
+
+CHECK_INTERVAL = 5.0     # segundos entre health checks de um nó
+REQUEST_TIMEOUT = 5      # timeout HTTP por requisição
+MAX_BLOCK_LAG = 2        # leitura só em nós até N blocos atrás do mais alto conhecido
+EWMA_ALPHA = 0.3         # peso da última medida na latência média
+FAILURE_COOLDOWN = 2.0   # nó que falhou só volta a ser testado após este intervalo
+DIVERGENCE_COOLDOWN = 30.0   # nó em outra chain é comparado de novo após este intervalo
+
+
+def rpc_urls(default_url: str) -> list:
+    """URLs configuradas em HEFESTO_RPC_URLS, ou apenas `default_url`."""
+    raw = os.environ.get(RPC_URLS_ENV, "")
+    urls = [u.strip() for u in raw.split(",") if u.strip()]
+    return urls or [default_url]
+
+
+def is_transport_error(e: Exception) -> bool:
+    """Falha de rede/nó (vale tentar outro nó) — ao contrário de revert ou erro de validação."""
+    return isinstance(e, (RequestException, ConnectionError, TimeoutError, NodeUnavailable))
+
+
+class NodeUnavailable(Exception):
+    """Nenhum nó saudável (ou suficientemente sincronizado) para atender a requisição."""
+
+
+class Node:
+    def __init__(self, url: str, timeout: int = REQUEST_TIMEOUT):
+        self.url = url
+        self.w3 = Web3(Web3.HTTPProvider(url, request_kwargs={"timeout": timeout}))
+        self.healthy = True          # otimista até o primeiro check
+        self.latency = None          # EWMA em segundos
+        self.block = 0
+        self.last_check = 0.0
+        self.failures = 0
+        self.chain_id = None
+        self.divergent = None        # motivo, quando o nó não serve a mesma chain da referência
+
+    def observe(self, latency: float):
+        if self.latency is None:
+            self.latency = latency
+        else:
+            self.latency = EWMA_ALPHA * latency + (1 - EWMA_ALPHA) * self.latency
+
+    def score(self) -> float:
+        # nó ainda sem medida entra com latência neutra para ser experimentado
+        return self.latency if self.latency is not None else 0.05
+
+
+class ProviderPool:
+    """
+    Vários nós RPC atrás de uma única interface.
+    Leituras: nó saudável, dentro da altura mínima, escolhido por latência (duas escolhas aleatórias).
+    Escritas: tenta os nós em ordem de latência até um aceitar a transação.
+    Todos os nós precisam servir a mesma chain. A referência é a primeira URL configurada (ou a
+    próxima, na ordem da lista, enquanto ela estiver fora); um nó com outro chain_id, ou outro hash de
+    bloco numa altura comum, fica fora do pool e é comparado de novo a cada DIVERGENCE_COOLDOWN.
+    """
+
+    def __init__(self, urls, check_interval: float = CHECK_INTERVAL, max_lag: int = MAX_BLOCK_LAG,
+                 timeout: int = REQUEST_TIMEOUT):
+        if isinstance(urls, str):
+            urls = [urls]
+        if not urls:
+            raise ValueError("Informe ao menos uma URL RPC.")
+        self.nodes = [Node(u, timeout) for u in urls]
+        self.check_interval = check_interval
+        self.max_lag = max_lag
+        self.min_block = 0           # maior bloco visto em receipts (ler-o-que-escreveu)
+        self._lock = threading.Lock()
+
+    # ---------------------------
+    # Health check
+    # ---------------------------
+
+    def check(self, node: Node) -> bool:
+        t0 = time.time()
+        try:
+            block = node.w3.eth.block_number
+            latency = time.time() - t0
+            if node.chain_id is None:
+                node.chain_id = node.w3.eth.chain_id
+            node.block = block
+            node.divergent = self._divergence(node)
+        except Exception:
+            node.healthy = False
+            node.failures += 1
+            node.last_check = time.time()
+            return False
+        node.last_check = time.time()
+        if node.divergent:
+            node.healthy = False
+            return False
+        node.observe(latency)
+        node.healthy = True
+        node.failures = 0
+        return True
+
+    def _reference_for(self, node: Node):
+        """Primeiro nó da lista, antes de `node`, saudável e na chain certa (None: `node` é a referência)."""
+        for n in self.nodes:
+            if n is node:
+                return None
+            if n.healthy and not n.divergent and n.chain_id is not None:
+                return n
+        return None
+
+    def _divergence(self, node: Node) -> str:
+        """Motivo para recusar `node` (não está na chain da referência), ou None."""
+        ref = self._reference_for(node)
+        if ref is None:
+            return None
+        if node.chain_id != ref.chain_id:
+            return f"chain_id {node.chain_id} difere de {ref.chain_id} ({ref.url})"
+        # altura que os dois já têm, abaixo da ponta para não confundir com reorg recente
+        height = max(min(node.block, ref.block) - self.max_lag, 0)
+        ours = node.w3.eth.get_block(height)["hash"]
+        try:
+            theirs = ref.w3.eth.get_block(height)["hash"]
+        except Exception:
+            return None
+        if ours != theirs:
+            return f"bloco {height} difere de {ref.url} (outra chain ou fork)"
+        return None
+
+    def refresh(self, force: bool = False):
+        """Reavalia os nós cujo último check expirou (nós com falha respeitam o cooldown)."""
+        now = time.time()
+        for node in self.nodes:
+            if node.divergent:
+                interval = DIVERGENCE_COOLDOWN
+            else:
+                interval = self.check_interval if node.healthy else FAILURE_COOLDOWN
+            if force or now - node.last_check >= interval:
+                self.check(node)
+
+    def _mark_failed(self, node: Node):
+        node.healthy = False
+        node.failures += 1
+        node.last_check = time.time()
+
+    def available(self) -> bool:
+        """Há ao menos um nó saudável (segundo o último check)?"""
+        return any(n.healthy for n in self.nodes)
+
+    def head(self) -> int:
+        return max((n.block for n in self.nodes if n.healthy), default=0)
+
+    def status(self) -> list:
+        """Resumo por nó para exibição/diagnóstico."""
+        return [{
+            "url": n.url,
+            "saudavel": n.healthy,
+            "latencia_ms": round(n.latency * 1000, 1) if n.latency is not None else None,
+            "bloco": n.block,
+            "divergente": n.divergent,
+        } for n in self.nodes]
+
+    # ---------------------------
+    # Seleção
+    # ---------------------------
+
+    def _read_candidates(self, min_block: int) -> list:
+        required = max(min_block, self.head() - self.max_lag)
+        return [n for n in self.nodes if n.healthy and n.block >= required]
+
+    def pick_read(self, min_block: int = None) -> Node:
+        self.refresh()
+        min_block = max(min_block or 0, self.min_block)
+        nodes = self._read_candidates(min_block)
+        if not nodes:
+            # os blocos conhecidos podem estar desatualizados — mede de novo antes de desistir
+            self.refresh(force=True)
+            nodes = self._read_candidates(min_block)
+        if not nodes:
+            raise NodeUnavailable(f"Nenhum nó RPC saudável com bloco >= {min_block}.")
+        if len(nodes) == 1:
+            return nodes[0]
+        a, b = random.sample(nodes, 2)
+        return a if a.score() <= b.score() else b
+
+    def write_order(self) -> list:
+        """Nós para escrita: saudáveis por latência, depois os demais como último recurso."""
+        self.refresh()
+        healthy = sorted((n for n in self.nodes if n.healthy), key=lambda n: n.score())
+        return healthy + [n for n in self.nodes if not n.healthy and not n.divergent]
+
+    def primary(self) -> Web3:
+        """Web3 do melhor nó de escrita (montagem de transações, nonce, chain id)."""
+        return self.write_order()[0].w3
+
+    # ---------------------------
+    # Operações
+    # ---------------------------
+
+    def read(self, fn, min_block: int = None, attempts: int = None):
+        """
+        Executa `fn(w3)` num nó de leitura; em falha de transporte, marca o nó e tenta outro.
+        Erros do contrato (revert, argumentos) sobem sem failover.
+        """
+        attempts = attempts or len(self.nodes)
+        last = None
+        for _ in range(attempts):
+            node = self.pick_read(min_block)
+            t0 = time.time()
+            try:
+                result = fn(node.w3)
+            except Exception as e:
+                if not is_transport_error(e):
+                    raise
+                self._mark_failed(node)
+                last = e
+                continue
+            node.observe(time.time() - t0)
+            return result
+        raise NodeUnavailable(f"Leitura falhou em todos os nós: {last}")
+
+    def send_raw_transaction(self, raw):
+        """Envia a transação assinada ao primeiro nó que aceitar (mesmo raw = mesma tx em qualquer nó)."""
+        last = None
+        for node in self.write_order():
+            try:
+                return node.w3.eth.send_raw_transaction(raw)
+            except Exception as e:
+                msg = str(e).lower()
+                if "already known" in msg or "already imported" in msg:
+                    # outro nó já propagou esta transação — o hash é o keccak do raw
+                    return Web3.keccak(raw)
+                if not is_transport_error(e):
+                    raise
+                self._mark_failed(node)
+                last = e
+        raise NodeUnavailable(f"Nenhum nó aceitou a transação: {last}")
+
+    def observe_block(self, block: int):
+        """Registra o bloco de uma escrita confirmada: leituras seguintes exigem nós nessa altura."""
+        with self._lock:
+            self.min_block = max(self.min_block, block)
+
+    def wait_for_receipt(self, tx_hash, timeout: float = 120, poll: float = 0.1):
+        """Aguarda o receipt consultando os nós de escrita; registra o bloco para leituras consistentes."""
+        deadline = time.time() + timeout
+        while True:
+            for node in self.write_order():
+                try:
+                    receipt = node.w3.eth.get_transaction_receipt(tx_hash)
+                except TransactionNotFound:
+                    continue
+                except Exception as e:
+                    if not is_transport_error(e):
+                        raise
+                    self._mark_failed(node)
+                    continue
+                if receipt is not None:
+                    self.observe_block(receipt.blockNumber)
+                    return receipt
+            if time.time() >= deadline:
+                raise TimeoutError(f"Receipt de {Web3.to_hex(tx_hash)} não apareceu em {timeout}s.")
+            time.sleep(poll)
+            poll = min(poll * 2, 1.0)
@@ -0,0 +1,221 @@
+# signers.py — pool de assinantes (uma chave por quartel) com nonce independente
+import json
+import os
+import threading
+
+from web3 import Web3
+
+# ---------------------------
+# CONFIGURAÇÕES
+# ---------------------------
+
+# Diretório com keystores no formato V3 (geth / ganache --account_keys_path / web3 Account.encrypt)
+KEYSTORE_DIR = os.environ.get(
+    "HEFESTO_KEYSTORE",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "keystore"),
+)
+
+# Senha única dos keystores (PoC local)
+KEYSTORE_PASSWORD_ENV = "HEFESTO_KEYSTORE_PASSWORD"
+
+DEFAULT_GAS = 3000000
+DEFAULT_GAS_PRICE_GWEI = 1
+
+
+def _raw_bytes(signed):
+    """Web3.py >= 7 usa raw_transaction; versões antigas, rawTransaction."""
+    raw = getattr(signed, "raw_transaction", None)
+    if raw is None:
+        raw = signed.rawTransaction
+    return raw
+
+
+# ---------------------------
+# NONCE POR ASSINANTE
+# ---------------------------
+
+class NonceLane:
+    """
+    Sequência de nonces de um único assinante.
+    O lock cobre apenas reserva de nonce + envio; a espera do receipt fica fora,
+    assim cada quartel avança sem esperar os demais.
+    """
+
+    def __init__(self, address: str):
+        self.address = address
+        self.lock = threading.Lock()
+        self._next = None
+
+    def reserve(self, w3) -> int:
+        """
+        Devolve o próximo nonce (chamar com self.lock adquirido).
+        O nó é consultado a cada reserva: a mesma conta pode ter enviado por outro processo
+        (client.py, outra interface, Remix); o valor em memória só cobre envios ainda não vistos pelo nó.
+        """
+        pending = w3.eth.get_transaction_count(self.address, "pending")
+        self._next = pending if self._next is None else max(self._next, pending)
+        return self._next
+
+    def advance(self):
+        self._next += 1
+
+    def reset(self):
+        """Descarta o nonce em memória — será relido do nó no próximo envio."""
+        self._next = None
+
+
+# ---------------------------
+# POOL DE ASSINANTES
+# ---------------------------
+
+class SignerPool:
+    """Mapeia endereço do quartel -> chave privada, com um NonceLane por endereço."""
+
+    def __init__(self, default_address: str = None):
+        self._keys = {}
+        self._lanes = {}
+        self.default_address = (
+            Web3.to_checksum_address(default_address) if default_address else None
+        )
+
+    def add(self, address: str, private_key: str):
+        addr = Web3.to_checksum_address(address)
+        self._keys[addr] = private_key
+        self._lanes.setdefault(addr, NonceLane(addr))
+
+    def has(self, address: str) -> bool:
+        try:
+            return Web3.to_checksum_address(address) in self._keys
+        except Exception:
+            return False
+
+    def addresses(self):
+        return list(self._keys.keys())
+
+    def lane(self, address: str) -> NonceLane:
+        return self._lanes[self.resolve(address)]
+
+    def resolve(self, sender: str = None) -> str:
+        """Endereço que vai assinar: o pedido, ou o padrão quando não informado."""
+        addr = sender or self.default_address
+        if addr is None:
+            raise ValueError("Nenhum assinante informado e nenhum assinante padrão configurado.")
+        addr = Web3.to_checksum_address(addr)
+        if addr not in self._keys:
+            raise ValueError(f"Sem chave no keystore para o quartel {addr}.")
+        return addr
+
+    def sign(self, w3, fn, sender: str = None, gas: int = DEFAULT_GAS,
+             gas_price_gwei: int = DEFAULT_GAS_PRICE_GWEI, nonce: int = None):
+        """
+        Constrói e assina a transação de `fn` (ContractFunction já com argumentos).
+        Sem `nonce`, usa o valor corrente da lane (sem avançar) — uso interno de `send`.
+        """
+        addr = self.resolve(sender)
+        if nonce is None:
+            nonce = self._lanes[addr].reserve(w3)
+        tx = fn.build_transaction({
+            "from": addr,
+            "nonce": nonce,
+            "gas": gas,
+            "gasPrice": w3.to_wei(gas_price_gwei, "gwei"),
+        })
+        signed = w3.eth.account.sign_transaction(tx, private_key=self._keys[addr])
+        return _raw_bytes(signed)
+
+    def send(self, w3, fn, sender: str = None, gas: int = DEFAULT_GAS,
+             gas_price_gwei: int = DEFAULT_GAS_PRICE_GWEI, submit=None):
+        """
+        Assina com a chave do `sender` e envia. Retorna o tx_hash (não espera receipt).
+        `submit` permite trocar o envio do raw (padrão: w3.eth.send_raw_transaction).
+        """
+        addr = self.resolve(sender)
+        lane = self._lanes[addr]
+        submit = submit or w3.eth.send_raw_transaction
+        with lane.lock:
+            try:
+                raw = self.sign(w3, fn, addr, gas=gas, gas_price_gwei=gas_price_gwei)
+                tx_hash = submit(raw)
+            except Exception:
+                lane.reset()
+                raise
+            lane.advance()
+        return tx_hash
+
+    def sign_transfer(self, w3, to: str, value_wei: int, sender: str = None,
+                      gas_price_gwei: int = DEFAULT_GAS_PRICE_GWEI, nonce: int = None):
+        """Assina (sem enviar) uma transferência simples de ETH. Sem `nonce`, usa o valor corrente da lane."""
+        addr = self.resolve(sender)
+        if nonce is None:
+            nonce = self._lanes[addr].reserve(w3)
+        tx = {
+            "to": Web3.to_checksum_address(to),
+            "value": value_wei,
+            "gas": 21000,
+            "gasPrice": w3.to_wei(gas_price_gwei, "gwei"),
+            "nonce": nonce,
+            "chainId": w3.eth.chain_id,
+        }
+        signed = w3.eth.account.sign_transaction(tx, private_key=self._keys[addr])
+        return _raw_bytes(signed)
+
+    def transfer(self, w3, to: str, value_wei: int, sender: str = None,
+                 gas_price_gwei: int = DEFAULT_GAS_PRICE_GWEI):
+        """Transferência simples de ETH na lane do `sender`. Retorna o tx_hash."""
+        addr = self.resolve(sender)
+        lane = self._lanes[addr]
+        with lane.lock:
+            try:
+                raw = self.sign_transfer(w3, to, value_wei, addr, gas_price_gwei=gas_price_gwei)
+                tx_hash = w3.eth.send_raw_transaction(raw)
+            except Exception:
+                lane.reset()
+                raise
+            lane.advance()
+        return tx_hash
+
+
+def load_keystore(path: str = KEYSTORE_DIR, password: str = None) -> dict:
+    """
+    Lê todos os keystores V3 (*.json) de `path` e devolve {endereço: chave privada}.
+    Diretório inexistente -> dicionário vazio.
+    """
+    from eth_account import Account
+
+    keys = {}
+    if not os.path.isdir(path):
+        return keys
+    if password is None:
+        password = os.environ.get(KEYSTORE_PASSWORD_ENV, "")
+    for name in sorted(os.listdir(path)):
+        full = os.path.join(path, name)
+        if not os.path.isfile(full):
+            continue
+        try:
+            with open(full, "r", encoding="utf-8") as f:
+                keyfile = json.load(f)
+        except (ValueError, UnicodeDecodeError):
+            continue
+        if "address" not in keyfile or ("crypto" not in keyfile and "Crypto" not in keyfile):
+            continue
+        try:
+            key = Account.decrypt(keyfile, password)
+        except Exception as e:
+            raise ValueError(f"Falha ao abrir keystore {name}: {e}")
+        address = keyfile["address"].lower()
+        if not address.startswith("0x"):
+            address = "0x" + address
+        # HexBytes.hex() inclui ou não o 0x conforme a versão
+        key_hex = bytes(key).hex()
+        keys[Web3.to_checksum_address(address)] = "0x" + key_hex
+    return keys
+
+
+def build_signer_pool(default_address: str, default_private_key: str,
+                      keystore_dir: str = KEYSTORE_DIR, password: str = None) -> SignerPool:
+    """Pool com a conta padrão do PoC + todas as contas do keystore local."""
+    pool = SignerPool(default_address)
+    pool.add(default_address, default_private_key)
+    for addr, key in load_keystore(keystore_dir, password).items():
+        pool.add(addr, key)
+    return pool
@@ -0,0 +1,177 @@
+# test_audit_export.py — recuperação de execuções interrompidas, contra um nó falso em memória
+#
+#   python -m pytest -q python/test_audit_export.py
+import argparse
+import json
+import os
+
+import pytest
+from eth_abi import decode, encode
+from web3 import Web3
+from web3.providers import BaseProvider
+
+import audit_export
+from audit_export import CHECKPOINT_FILE, TABLES, TableWriter, rollback_incomplete, run
+
+LOGISTICA = Web3.to_checksum_address(audit_export.CONTRACT_LOGISTICA_ADDRESS)
+ORIGEM = "0x90F8bf6A479f320ead074411a4B0e7944Ea8c9C1"
+DESTINO = "0xFFcf8FDEE72ac11b5c542428B35EEF5769C409f0"
+HEAD = 12
+
+CRIADA = Web3.keccak(text="OperacaoCriada(uint256,address,address,bytes32,uint256)")
+GET_OPERATION = Web3.keccak(text="getOperation(uint256)")[:4]
+
+
+def _topic(value) -> str:
+    if isinstance(value, int):
+        return "0x" + value.to_bytes(32, "big").hex()
+    return "0x" + bytes.fromhex(value[2:]).rjust(32, b"\0").hex()
+
+
+class FakeNode(BaseProvider):
+    """Um OperacaoCriada por bloco (bloco n cria a operação n); getOperation devolve a operação pendente."""
+
+    def __init__(self, head: int = HEAD):
+        super().__init__()
+        self.head = head
+
+    def _log(self, n: int) -> dict:
+        return {
+            "address": LOGISTICA,
+            "topics": [Web3.to_hex(CRIADA), _topic(n), _topic(ORIGEM), _topic(DESTINO)],
+            "data": "0x" + encode(["bytes32", "uint256"], [bytes([n]) * 32, 1000 + n]).hex(),
+            "blockNumber": hex(n), "blockHash": _topic(n), "transactionHash": _topic(10_000 + n),
+            "transactionIndex": "0x0", "logIndex": "0x0", "removed": False,
+        }
+
+    def _operation(self, op_id: int) -> str:
+        return "0x" + encode(
+            ["address", "address", "bytes32", "bool", "bool", "uint8", "uint256", "uint256"],
+            [ORIGEM, DESTINO, bytes([op_id]) * 32, False, False, 1, 1000 + op_id, 0],
+        ).hex()
+
+    def make_request(self, method, params):
+        if method == "eth_chainId":
+            result = "0x539"
+        elif method == "eth_blockNumber":
+            result = hex(self.head)
+        elif method == "eth_getLogs":
+            lo, hi = int(params[0]["fromBlock"], 16), int(params[0]["toBlock"], 16)
+            result = [self._log(n) for n in range(max(lo, 1), min(hi, self.head) + 1)]
+        elif method == "eth_getBlockByNumber":
+            n = int(params[0], 16)
+            result = {"number": hex(n), "hash": _topic(n), "timestamp": hex(1000 + n)}
+        elif method == "eth_call":
+            data = bytes.fromhex(params[0]["data"][2:])
+            assert data[:4] == GET_OPERATION
+            result = self._operation(decode(["uint256"], data[4:])[0])
+        else:
+            raise NotImplementedError(method)
+        return {"jsonrpc": "2.0", "id": 1, "result": result}
+
+
+class FakePool:
+    def __init__(self, urls=None):
+        self.w3 = Web3(FakeNode())
+
+    def read(self, fn, min_block=None, attempts=None):
+        return fn(self.w3)
+
+    def primary(self):
+        return self.w3
+
+
+class Crash(Exception):
+    pass
+
+
+@pytest.fixture(autouse=True)
+def fake_pool(monkeypatch):
+    monkeypatch.setattr(audit_export, "ProviderPool", FakePool)
+
+
+def _args(out_dir, parquet=False) -> argparse.Namespace:
+    return argparse.Namespace(saida=str(out_dir), rpc="http://fake", logistica=LOGISTICA, inventario="",
+                              parquet=parquet, lote_blocos=4, row_group=2, confirmacoes=0, desde=0)
+
+
+def _ndjson(out_dir, table) -> list:
+    with open(os.path.join(out_dir, f"{table}.ndjson"), "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+
+def _assert_exported_once(out_dir):
+    events = _ndjson(out_dir, "events")
+    assert [e["bloco"] for e in events] == list(range(1, HEAD + 1))
+    assert [o["id"] for o in _ndjson(out_dir, "operations")] == list(range(1, HEAD + 1))
+    # args ficam aninhados no NDJSON (uma decodificação só)
+    assert events[0]["args"]["origem"] == ORIGEM
+
+
+def _crash_in(monkeypatch, target, name, after=0):
+    """Faz `target.name` levantar Crash depois de `after` chamadas bem-sucedidas."""
+    original = getattr(target, name)
+    calls = {"n": 0}
+
+    def wrapper(*a, **kw):
+        if calls["n"] >= after:
+            raise Crash(name)
+        calls["n"] += 1
+        return original(*a, **kw)
+
+    monkeypatch.setattr(target, name, wrapper)
+
+
+@pytest.mark.parametrize("target,name,after", [
+    (audit_export.AuditExporter, "export_range", 1),   # no meio das faixas
+    (audit_export, "save_checkpoint", 0),              # depois de close(), antes do checkpoint
+    (TableWriter, "publish", 0),                       # checkpoint salvo, partes ainda .tmp
+])
+def test_execucao_interrompida_nao_duplica(tmp_path, monkeypatch, target, name, after):
+    parquet = name == "publish"
+    if parquet:
+        pytest.importorskip("pyarrow")
+    with monkeypatch.context() as m:
+        _crash_in(m, target, name, after)
+        with pytest.raises(Crash):
+            run(_args(tmp_path, parquet))
+    run(_args(tmp_path, parquet))
+    _assert_exported_once(tmp_path)
+    if parquet:
+        import pyarrow.parquet as pq
+
+        parts = sorted(os.listdir(tmp_path / "events"))
+        assert parts == [f"part-{0:012d}-{HEAD:012d}.parquet"]
+        assert pq.read_table(tmp_path / "events" / parts[0]).num_rows == HEAD
+
+
+def test_rollback_de_partes(tmp_path):
+    part_dir = tmp_path / "events"
+    part_dir.mkdir()
+    for name in ("part-a.parquet", "part-b.parquet", "part-c.parquet.tmp", "part-d.parquet.tmp"):
+        (part_dir / name).write_bytes(b"x")
+    (tmp_path / "events.ndjson").write_bytes(b"linha 1\nlinha 2 incompleta")
+    checkpoint = {"ultimo_bloco": 5, "ndjson_bytes": {"events": 8},
+                  "partes": {"events": ["part-a.parquet", "part-c.parquet"]}}
+    rollback_incomplete(str(tmp_path), checkpoint)
+    # b não está no checkpoint; c estava listada mas não foi renomeada; d é de execução interrompida
+    assert sorted(os.listdir(part_dir)) == ["part-a.parquet", "part-c.parquet"]
+    assert (tmp_path / "events.ndjson").read_bytes() == b"linha 1\n"
+
+
+def test_checkpoint_antigo_adota_partes_existentes(tmp_path):
+    part_dir = tmp_path / "events"
+    part_dir.mkdir()
+    (part_dir / "part-antiga.parquet").write_bytes(b"x")
+    for table in TABLES:
+        (tmp_path / f"{table}.ndjson").write_bytes(b"")
+    # checkpoint gravado antes de existir a lista de partes
+    with open(tmp_path / CHECKPOINT_FILE, "w", encoding="utf-8") as f:
+        json.dump({"ultimo_bloco": 0, "ndjson_bytes": {t: 0 for t in TABLES}}, f)
+    run(_args(tmp_path))
+    with open(tmp_path / CHECKPOINT_FILE, "r", encoding="utf-8") as f:
+        checkpoint = json.load(f)
+    assert checkpoint["partes"]["events"] == ["part-antiga.parquet"]
+    rollback_incomplete(str(tmp_path), checkpoint)
+    assert os.listdir(part_dir) == ["part-antiga.parquet"]
+    _assert_exported_once(tmp_path)
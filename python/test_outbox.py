@@ -0,0 +1,247 @@
+# test_outbox.py — outbox contra uma chain falsa em memória (sem nó RPC)
+#
+#   python -m pytest -q python/test_outbox.py
+import json
+import types
+
+from web3 import Web3
+from web3.exceptions import ContractLogicError, TransactionNotFound
+
+from outbox import CONFIRMADO, ENVIADO, FALHOU, NONCE_FILLER, REVERTIDO, Outbox
+from signers import SignerPool
+
+SENDER = "0x90F8bf6A479f320ead074411a4B0e7944Ea8c9C1"
+KEY = "0x" + "11" * 32
+
+
+class FakeChain:
+    """
+    Mempool + mineração de um único nó: uma transação só minera quando o nonce anterior do
+    remetente já foi minerado. Raws com `"fn": "ruim"` são rejeitados enquanto `strict` estiver ligado;
+    `"fn": "reverte"` minera com status 0.
+    """
+
+    def __init__(self):
+        self.nonces = {}          # remetente -> próximo nonce minerado
+        self.mempool = {}         # (remetente, nonce) -> raw
+        self.receipts = {}        # tx_hash -> receipt
+        self.executed = []        # fn de cada transação minerada, na ordem
+        self.auto_mine = True
+        self.strict = True
+        self.mine_after_read = False   # minera logo depois da próxima leitura de nonce/receipt
+
+    def send(self, raw):
+        tx = json.loads(raw)
+        if self.strict and tx.get("fn") == "ruim":
+            raise ValueError("invalid transaction: rejeitada pelo nó")
+        if tx["nonce"] < self.nonces.get(tx["from"], 0):
+            raise ValueError("nonce too low")
+        self.mempool[(tx["from"], tx["nonce"])] = raw
+        if self.auto_mine:
+            self.mine()
+        return Web3.keccak(raw)
+
+    def mine(self):
+        for sender in {s for s, _ in self.mempool}:
+            nonce = self.nonces.get(sender, 0)
+            while (sender, nonce) in self.mempool:
+                raw = self.mempool.pop((sender, nonce))
+                fn = json.loads(raw).get("fn", "transfer")
+                self.executed.append(fn)
+                self.receipts[Web3.to_hex(Web3.keccak(raw))] = types.SimpleNamespace(
+                    status=0 if fn == "reverte" else 1, blockNumber=len(self.executed))
+                nonce += 1
+            self.nonces[sender] = nonce
+
+    def restart(self):
+        """Nó reiniciado: mempool perdido."""
+        self.mempool.clear()
+
+    def drop(self, sender, nonce):
+        """Só esta transação some do mempool (expulsa, ou não propagada para o nó que ficou)."""
+        self.mempool.pop((sender, nonce))
+
+    def _after_read(self):
+        if self.mine_after_read:
+            self.mine_after_read = False
+            self.mine()
+
+
+class FakeEth:
+    def __init__(self, chain):
+        self.chain = chain
+        self.account = self
+        self.chain_id = 1337
+
+    def get_transaction_count(self, address, block="latest"):
+        nonce = self.chain.nonces.get(address, 0)
+        if block == "pending":
+            while (address, nonce) in self.chain.mempool:
+                nonce += 1
+        self.chain._after_read()
+        return nonce
+
+    def get_transaction_receipt(self, tx_hash):
+        receipt = self.chain.receipts.get(tx_hash)
+        self.chain._after_read()
+        if receipt is None:
+            raise TransactionNotFound(tx_hash)
+        return receipt
+
+    def sign_transaction(self, tx, private_key):
+        # "processo" distingue raws de processos diferentes para a mesma chamada e nonce
+        tx = dict(tx, **{"from": tx.get("from", SENDER), "processo": id(self)})
+        return types.SimpleNamespace(raw_transaction=json.dumps(tx, sort_keys=True).encode())
+
+
+class FakeW3:
+    def __init__(self, chain):
+        self.eth = FakeEth(chain)
+
+    @staticmethod
+    def to_wei(value, unit):
+        return Web3.to_wei(value, unit)
+
+
+class FakeFn:
+    def __init__(self, name):
+        self.name = name
+
+    def build_transaction(self, tx):
+        return dict(tx, fn=self.name)
+
+    def call(self, tx=None, block_identifier="latest"):
+        if self.name == "reverte":
+            raise ContractLogicError("execution reverted: Item ja registrado")
+        return None
+
+
+class FakeProviders:
+    def __init__(self, chain):
+        self.chain = chain
+        self.w3 = FakeW3(chain)
+
+    def primary(self):
+        return self.w3
+
+    def available(self):
+        return True
+
+    def observe_block(self, block):
+        self.min_block = max(getattr(self, "min_block", 0), block)
+
+    def send_raw_transaction(self, raw):
+        return self.chain.send(raw)
+
+
+def make_outbox(tmp_path, chain):
+    signers = SignerPool(SENDER)
+    signers.add(SENDER, KEY)
+    return Outbox(str(tmp_path / "outbox.db"), lambda w3, c, fn, args: FakeFn(fn),
+                  signers, FakeProviders(chain))
+
+
+def flush_all(box, rounds=5):
+    for _ in range(rounds):
+        box.flush()
+
+
+def test_rejeicao_libera_nonce(tmp_path):
+    chain = FakeChain()
+    box = make_outbox(tmp_path, chain)
+    ids = [box.enqueue("logistica", fn, []) for fn in ("ok1", "ruim", "ok2", "ok3")]
+    flush_all(box)
+    assert [box.get(i)["status"] for i in ids] == [CONFIRMADO, FALHOU, CONFIRMADO, CONFIRMADO]
+    assert chain.executed == ["ok1", "ok2", "ok3"]
+    assert box.backlog() == 0
+
+
+def _send_unmined(box, chain, fns):
+    """ok1 minerado; depois `fns` ficam no mempool (nonces 1, 2, ...) sem minerar."""
+    box.enqueue("logistica", "ok1", [])
+    flush_all(box)
+    chain.auto_mine, chain.strict = False, False
+    ids = [box.enqueue("logistica", fn, []) for fn in fns]
+    box.flush()
+    assert [box.get(i)["nonce"] for i in ids] == list(range(1, len(fns) + 1))
+    assert all(box.get(i)["status"] == ENVIADO for i in ids)
+    return ids
+
+
+def _fillers(box):
+    with box._connect() as db:
+        return db.execute("SELECT * FROM outbox WHERE contract_type = ?", (NONCE_FILLER,)).fetchall()
+
+
+def test_rejeicao_no_reenvio_preenche_nonce(tmp_path):
+    chain = FakeChain()
+    box = make_outbox(tmp_path, chain)
+    ids = _send_unmined(box, chain, ("ruim", "ok2", "ok3"))
+    # nó reinicia (mempool perdido) e passa a rejeitar o "ruim"
+    chain.restart()
+    chain.auto_mine, chain.strict = True, True
+    flush_all(box)
+    assert [box.get(i)["status"] for i in ids] == [FALHOU, CONFIRMADO, CONFIRMADO]
+    # os registros seguintes mantêm os nonces (e os raws) já assinados
+    assert [box.get(i)["nonce"] for i in ids[1:]] == [2, 3]
+    assert chain.executed == ["ok1", "transfer", "ok2", "ok3"]
+    assert [(f["nonce"], f["status"]) for f in _fillers(box)] == [(1, CONFIRMADO)]
+    assert box.backlog() == 0
+
+
+def test_rejeicao_com_seguintes_no_mempool_nao_duplica(tmp_path):
+    chain = FakeChain()
+    box = make_outbox(tmp_path, chain)
+    ids = _send_unmined(box, chain, ("ruim", "ok2", "ok3"))
+    # só o nonce 1 some; os raws de 2 e 3 continuam no mempool esperando o buraco
+    chain.drop(SENDER, 1)
+    chain.auto_mine, chain.strict = True, True
+    flush_all(box)
+    assert [box.get(i)["status"] for i in ids] == [FALHOU, CONFIRMADO, CONFIRMADO]
+    assert chain.executed == ["ok1", "transfer", "ok2", "ok3"]
+    assert box.backlog() == 0
+
+
+def test_minerada_entre_leituras_nao_reassina(tmp_path):
+    chain = FakeChain()
+    chain.auto_mine = False
+    box = make_outbox(tmp_path, chain)
+    op = box.enqueue("logistica", "ok1", [])
+    box.flush()
+    assert box.get(op)["status"] == ENVIADO
+    # a transação minera entre a primeira e a segunda leitura do _reconcile
+    chain.mine_after_read = True
+    box.flush()
+    assert box.get(op)["status"] == CONFIRMADO
+    chain.auto_mine = True
+    flush_all(box)
+    assert chain.executed == ["ok1"]
+
+
+def test_revert_guarda_motivo(tmp_path):
+    chain = FakeChain()
+    box = make_outbox(tmp_path, chain)
+    op = box.enqueue("inventario", "reverte", [])
+    flush_all(box)
+    row = box.get(op)
+    assert row["status"] == REVERTIDO
+    assert "Item ja registrado" in row["error"]
+
+
+def test_dois_processos_nao_assinam_o_mesmo_registro(tmp_path):
+    chain = FakeChain()
+    box_a = make_outbox(tmp_path, chain)
+    box_b = make_outbox(tmp_path, chain)   # outro processo, mesmo arquivo, outra SignerPool
+    op = box_a.enqueue("logistica", "ok1", [])
+    sign = box_a.signers.sign
+
+    def sign_racing(*args, **kwargs):
+        # B roda a rodada inteira entre o SELECT e o UPDATE de A
+        box_a.signers.sign = sign
+        box_b.flush()
+        return sign(*args, **kwargs)
+
+    box_a.signers.sign = sign_racing
+    flush_all(box_a)
+    assert box_a.get(op)["status"] == CONFIRMADO
+    assert chain.executed == ["ok1"]